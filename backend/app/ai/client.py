@@ -3,20 +3,58 @@ AI client for process legitimacy analysis.
 Uses OpenAI-compatible API (configurable via environment).
 """
 
-import json
+import asyncio
+import hashlib
 import logging
-from typing import Any
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Coroutine
 
-from openai import OpenAI
+import httpx
+import orjson
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    BadRequestError,
+    RateLimitError,
+)
 
 from app.config import settings
 from app.models import ProcessInfo, LegitimacyStatus
-from app.ai.prompts import SYSTEM_PROMPT, create_batch_prompt
-from app.ai.rate_limiter import SyncRateLimiter, RateLimitConfig
+from app.ai.prompts import SYSTEM_PROMPT, create_batch_prompt, format_process_for_ai
+from app.ai.rate_limiter import RateLimiter, RateLimitConfig
 
 
 logger = logging.getLogger(__name__)
 
+# Completion budget requested per batch
+MAX_RESPONSE_TOKENS = 4000
+
+# Typical completion size per assessed process (status, confidence, tags and
+# a 1-2 sentence reasoning), used to reserve rate-limit tokens up front
+RESPONSE_TOKENS_PER_PROCESS = 120
+
+# Context reserved for the completion, system prompt and prompt template
+PROMPT_RESERVE_TOKENS = 5000
+
+# AI legitimacy verdicts (lowercased) mapped to our status values
+_LEGITIMACY_MAP: dict[str, LegitimacyStatus] = {
+    "legitimate": LegitimacyStatus.LEGITIMATE,
+    "safe": LegitimacyStatus.LEGITIMATE,
+    "benign": LegitimacyStatus.LEGITIMATE,
+    "suspicious": LegitimacyStatus.SUSPICIOUS,
+    "suspect": LegitimacyStatus.SUSPICIOUS,
+    "malicious": LegitimacyStatus.MALICIOUS,
+    "malware": LegitimacyStatus.MALICIOUS,
+    "threat": LegitimacyStatus.MALICIOUS,
+}
+
+# Exponential backoff bounds for retried requests (seconds)
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
 
 class AIClient:
     """
@@ -25,22 +63,30 @@ class AIClient:
     """
     
     def __init__(self):
-        self.client = OpenAI(
-            base_url=settings.openai_base_url,
-            api_key=settings.openai_api_key,
-        )
         self.model = settings.openai_model
         
-        # Rate limiter
-        self.rate_limiter = SyncRateLimiter(RateLimitConfig(
+        # Rate limiter (shared by all in-flight batches)
+        self.rate_limiter = RateLimiter(RateLimitConfig(
             requests_per_minute=settings.ai_rate_limit_requests,
+            tokens_per_minute=settings.ai_rate_limit_tokens,
             batch_size=settings.ai_batch_size,
         ))
         
+        # Static system message, byte-identical across batches so providers
+        # can reuse the cached prefix
+        self.system_message = _build_system_message(settings.ai_prompt_cache_control)
+        
+        # Maximum number of batches in flight at once
+        self.concurrency = max(1, settings.ai_concurrency)
+        
+        # Prompt text per process, keyed by id() for the current run
+        self._fmt_cache: dict[int, str] = {}
+        
         # Stats tracking
         self.total_requests = 0
         self.total_tokens = 0
         self.failed_requests = 0
+        self.cache_hits = 0
     
     def analyze_processes(
         self,
@@ -58,73 +104,244 @@ class AIClient:
             Updated list of ProcessInfo with AI assessments
         """
         # Filter to flagged processes if requested
+        if only_flagged and not any(p.is_flagged for p in processes):
+            logger.info("No processes to analyze with AI")
+            return processes
+        
         to_analyze = [p for p in processes if not only_flagged or p.is_flagged]
         
         if not to_analyze:
             logger.info("No processes to analyze with AI")
             return processes
         
+        # Bound API spend on pathologically large sets, keeping the riskiest
+        max_processes = settings.ai_max_processes
+        if max_processes > 0 and len(to_analyze) > max_processes:
+            logger.warning(
+                f"{len(to_analyze)} processes eligible for AI analysis, "
+                f"limiting to the {max_processes} highest-risk"
+            )
+            to_analyze = sorted(
+                to_analyze, key=lambda p: p.risk_score, reverse=True
+            )[:max_processes]
+        
         logger.info(f"Analyzing {len(to_analyze)} processes with AI")
         
-        # Process in batches
-        batch_size = settings.ai_batch_size
-        pid_to_process = {p.pid: p for p in processes}
+        # Process in batches, dispatched concurrently
+        self._fmt_cache.clear()
+        try:
+            results = _run_coroutine(self._analyze_batches(to_analyze))
+        finally:
+            self._fmt_cache.clear()
+        
+        # Update processes with AI assessments, matched within their own batch
+        for batch, assessments in results:
+            if not assessments:
+                continue
+            batch_by_pid = {p.pid: p for p in batch}
+            for assessment in assessments:
+                process = batch_by_pid.get(assessment.get("pid"))
+                if process is not None:
+                    self._apply_assessment(process, assessment)
+        
+        return processes
+    
+    async def _analyze_batches(
+        self, to_analyze: list[ProcessInfo]
+    ) -> list[tuple[list[ProcessInfo], list[dict]]]:
+        """
+        Split processes into batches and analyze them concurrently.
+        Returns each batch paired with its assessments.
+        
+        At most ``self.concurrency`` requests are in flight at once, and each
+        request still waits on the rate limiter before being sent. Batches are
+        packed by estimated prompt tokens rather than by count alone. If
+        carving fails or the caller is cancelled, batches already started are
+        cancelled and awaited before the error propagates.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: list[asyncio.Task] = []
+        
+        # One pooled HTTP/2 connection is shared by all batches in the run
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=self.concurrency,
+                max_connections=self.concurrency,
+            ),
+            timeout=httpx.Timeout(settings.ai_timeout_seconds, connect=5.0),
+        )
         
-        for i in range(0, len(to_analyze), batch_size):
-            batch = to_analyze[i:i + batch_size]
+        # Retries are handled by _create_completion so they pass the rate limiter
+        async with AsyncOpenAI(
+            base_url=settings.openai_base_url,
+            api_key=settings.openai_api_key,
+            max_retries=0,
+            http_client=http_client,
+        ) as client:
+            async def run_batch(
+                batch: list[ProcessInfo]
+            ) -> tuple[list[ProcessInfo], list[dict]]:
+                async with semaphore:
+                    try:
+                        return batch, await self._analyze_batch_async(client, batch)
+                    except Exception as e:
+                        logger.error(f"AI batch analysis failed: {e}")
+                        return batch, []
             
             try:
-                assessments = self._analyze_batch(batch)
+                batch_size = max(1, settings.ai_batch_size)
+                start = 0
+                while start < len(to_analyze):
+                    end = self._next_batch_end(to_analyze, start, batch_size)
+                    tasks.append(asyncio.create_task(run_batch(to_analyze[start:end])))
+                    start = end
                 
-                # Update processes with AI assessments
-                for assessment in assessments:
-                    pid = assessment.get("pid")
-                    if pid and pid in pid_to_process:
-                        self._apply_assessment(pid_to_process[pid], assessment)
-                        
-            except Exception as e:
-                logger.error(f"AI batch analysis failed: {e}")
-                self.failed_requests += 1
+                return await asyncio.gather(*tasks)
+            except BaseException:
+                # Don't leave requests running (or their errors unretrieved)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+    
+    def _next_batch_end(
+        self, to_analyze: list[ProcessInfo], start: int, max_count: int
+    ) -> int:
+        """
+        Greedily pack processes into the next batch.
         
-        return processes
+        Adds processes from ``start`` until either ``max_count`` is reached or
+        the estimated prompt tokens would exceed the context budget. A batch
+        always holds at least one process.
+        
+        Returns:
+            Exclusive end index of the batch
+        """
+        budget = settings.openai_context_window - PROMPT_RESERVE_TOKENS
+        limit = min(len(to_analyze), start + max_count)
+        used = 0
+        end = start
+        
+        while end < limit:
+            tokens = len(self._format_process(to_analyze[end])) // 4
+            if end > start and used + tokens > budget:
+                break
+            used += tokens
+            end += 1
+        
+        return end
     
-    def _analyze_batch(self, processes: list[ProcessInfo]) -> list[dict]:
+    async def _analyze_batch_async(
+        self, client: AsyncOpenAI, processes: list[ProcessInfo]
+    ) -> list[dict]:
         """Analyze a batch of processes and return assessments."""
-        # Wait for rate limit
-        self.rate_limiter.acquire()
-        
         # Prepare process data for prompt
-        process_dicts = [self._process_to_dict(p) for p in processes]
-        prompt = create_batch_prompt(process_dicts)
+        prompt = create_batch_prompt([self._format_process(p) for p in processes])
+        
+        # Identical prompts are served from the response cache
+        cache_path = self._cache_path(prompt)
+        if cache_path is not None:
+            cached = _read_cached_assessments(cache_path)
+            if cached is not None:
+                logger.debug(f"AI cache hit for batch of {len(processes)} processes")
+                self.cache_hits += 1
+                return cached
+        
+        # Estimate request size for the rate limiter (roughly 4 characters per
+        # token); reserving the full completion cap would throttle the TPM
+        # bucket far below real usage until charge_actual refunds it
+        estimated_tokens = (len(SYSTEM_PROMPT) + len(prompt)) // 4 + min(
+            MAX_RESPONSE_TOKENS, RESPONSE_TOKENS_PER_PROCESS * len(processes)
+        )
         
         logger.debug(f"Sending batch of {len(processes)} processes to AI")
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=4000,
-            )
+            response = await self._create_completion(client, prompt, estimated_tokens)
             
             self.total_requests += 1
             
             # Track token usage
             if hasattr(response, 'usage') and response.usage:
                 self.total_tokens += response.usage.total_tokens
+                self.rate_limiter.charge_actual(response.usage.total_tokens - estimated_tokens)
             
             # Parse response
             content = response.choices[0].message.content
-            return self._parse_ai_response(content, processes)
+            assessments = self._parse_ai_response(content, processes)
+            
+            if cache_path is not None and assessments:
+                _write_cached_assessments(cache_path, assessments)
+            
+            return assessments
             
         except Exception as e:
             logger.error(f"AI API error: {e}")
             self.failed_requests += 1
             raise
     
+    async def _create_completion(
+        self, client: AsyncOpenAI, prompt: str, estimated_tokens: int
+    ) -> Any:
+        """
+        Send a chat completion request, retrying transient failures.
+        
+        Rate limit (429), server (5xx) and connection errors are retried up to
+        ``settings.ai_max_retries`` times with exponential backoff and full
+        jitter, honouring ``Retry-After`` when the provider sends it. Bad
+        requests are never retried.
+        """
+        max_retries = max(0, settings.ai_max_retries)
+        
+        # Ask for a bare JSON object where the provider supports it
+        extra_args: dict[str, Any] = {}
+        if settings.ai_json_mode:
+            extra_args["response_format"] = {"type": "json_object"}
+        
+        for attempt in range(max_retries + 1):
+            # Every attempt counts against the rate limit
+            await self.rate_limiter.acquire(estimated_tokens=estimated_tokens)
+            
+            try:
+                return await client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        self.system_message,
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=MAX_RESPONSE_TOKENS,
+                    **extra_args,
+                )
+            except BadRequestError:
+                raise
+            except (RateLimitError, APIStatusError, APIConnectionError) as e:
+                retryable = (
+                    isinstance(e, (RateLimitError, APIConnectionError))
+                    or e.status_code >= 500
+                )
+                if not retryable or attempt >= max_retries:
+                    raise
+                
+                delay = _retry_delay(attempt, e)
+                logger.warning(
+                    f"AI request failed ({e.__class__.__name__}), "
+                    f"retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})"
+                )
+                await asyncio.sleep(delay)
+    
+    def _cache_path(self, prompt: str) -> Path | None:
+        """Get the response cache file for a prompt, or None if caching is disabled."""
+        if not settings.ai_cache_enabled:
+            return None
+        
+        key = hashlib.blake2b(
+            f"{self.model}\x00{SYSTEM_PROMPT}\x00{prompt}".encode(),
+            digest_size=16
+        ).hexdigest()
+        return settings.ai_cache_dir / f"{key}.json"
+    
     def _parse_ai_response(
         self, content: str, processes: list[ProcessInfo]
     ) -> list[dict]:
@@ -132,13 +349,13 @@ class AIClient:
         # Try to extract JSON from response
         content = content.strip()
         
-        # Handle markdown code blocks
+        # Handle markdown code blocks (providers without JSON mode)
         if content.startswith("```"):
             lines = content.split("\n")
             content = "\n".join(lines[1:-1] if lines[-1] == "```" else lines[1:])
         
         try:
-            data = json.loads(content)
+            data = orjson.loads(content)
             
             if isinstance(data, dict) and "assessments" in data:
                 return data["assessments"]
@@ -148,11 +365,20 @@ class AIClient:
                 logger.warning(f"Unexpected AI response structure: {type(data)}")
                 return []
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse AI response as JSON: {e}")
             logger.debug(f"Response content: {content[:500]}")
             return []
     
+    def _format_process(self, process: ProcessInfo) -> str:
+        """Get the prompt text for a process, formatting it at most once per run."""
+        key = id(process)
+        formatted = self._fmt_cache.get(key)
+        if formatted is None:
+            formatted = format_process_for_ai(self._process_to_dict(process))
+            self._fmt_cache[key] = formatted
+        return formatted
+    
     def _process_to_dict(self, process: ProcessInfo) -> dict:
         """Convert ProcessInfo to dict for AI prompt."""
         return {
@@ -168,8 +394,8 @@ class AIClient:
             "file_operations": process.file_operations,
             "registry_operations": process.registry_operations,
             "network_operations": process.network_operations,
-            "accessed_files": process.accessed_files[:5],
-            "accessed_registry": process.accessed_registry[:5],
+            "accessed_files": process.accessed_files[:3],
+            "accessed_registry": process.accessed_registry[:3],
             "matched_rules": process.matched_rules,
         }
     
@@ -177,14 +403,7 @@ class AIClient:
         """Apply AI assessment to a ProcessInfo."""
         # Update legitimacy
         legitimacy_str = assessment.get("legitimacy", "").lower()
-        if legitimacy_str in ["legitimate", "safe", "benign"]:
-            process.legitimacy = LegitimacyStatus.LEGITIMATE
-        elif legitimacy_str in ["suspicious", "suspect"]:
-            process.legitimacy = LegitimacyStatus.SUSPICIOUS
-        elif legitimacy_str in ["malicious", "malware", "threat"]:
-            process.legitimacy = LegitimacyStatus.MALICIOUS
-        else:
-            process.legitimacy = LegitimacyStatus.UNKNOWN
+        process.legitimacy = _LEGITIMACY_MAP.get(legitimacy_str, LegitimacyStatus.UNKNOWN)
         
         # Update risk score (average with existing if any)
         ai_risk = assessment.get("risk_score")
@@ -200,19 +419,19 @@ class AIClient:
         if assessment.get("reasoning"):
             process.ai_reasoning = assessment["reasoning"]
         
-        # Update behavior tags
+        # Update behavior tags (ordered dedup)
         ai_tags = assessment.get("behavior_tags", [])
         if isinstance(ai_tags, list):
-            for tag in ai_tags:
-                if tag and tag not in process.behavior_tags:
-                    process.behavior_tags.append(tag)
+            process.behavior_tags = list(dict.fromkeys(
+                process.behavior_tags + [t for t in ai_tags if t and isinstance(t, str)]
+            ))
         
-        # Update MITRE techniques
+        # Update MITRE techniques (ordered dedup)
         mitre = assessment.get("mitre_techniques", [])
         if isinstance(mitre, list):
-            for technique in mitre:
-                if technique and technique not in process.mitre_techniques:
-                    process.mitre_techniques.append(technique)
+            process.mitre_techniques = list(dict.fromkeys(
+                process.mitre_techniques + [t for t in mitre if t and isinstance(t, str)]
+            ))
     
     def get_stats(self) -> dict:
         """Get client usage statistics."""
@@ -220,4 +439,85 @@ class AIClient:
             "total_requests": self.total_requests,
             "total_tokens": self.total_tokens,
             "failed_requests": self.failed_requests,
+            "cache_hits": self.cache_hits,
         }
+
+
+def _build_system_message(cache_control: bool) -> dict[str, Any]:
+    """
+    Build the system message sent with every batch.
+    
+    With ``cache_control`` the prompt is sent as a text part marked
+    ephemeral-cacheable, which Anthropic-compatible endpoints use for
+    explicit prompt caching. OpenAI caches identical prefixes automatically.
+    """
+    if not cache_control:
+        return {"role": "system", "content": SYSTEM_PROMPT}
+    
+    return {
+        "role": "system",
+        "content": [{
+            "type": "text",
+            "text": SYSTEM_PROMPT,
+            "cache_control": {"type": "ephemeral"},
+        }],
+    }
+
+
+def _read_cached_assessments(cache_path: Path) -> list[dict] | None:
+    """Load cached assessments, returning None on a miss or unreadable entry."""
+    try:
+        data = orjson.loads(cache_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable AI cache entry {cache_path.name}: {e}")
+        return None
+    
+    return data if isinstance(data, list) else None
+
+
+def _write_cached_assessments(cache_path: Path, assessments: list[dict]) -> None:
+    """Persist assessments to the response cache (best effort)."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        tmp_path.write_bytes(orjson.dumps(assessments))
+        tmp_path.replace(cache_path)
+    except (OSError, TypeError) as e:
+        logger.warning(f"Failed to write AI cache entry {cache_path.name}: {e}")
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """
+    Get the delay before retrying a failed request.
+    
+    Uses the provider's ``Retry-After`` header when present, otherwise
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(RETRY_MAX_DELAY, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+    
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _run_coroutine(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine to completion from synchronous code.
+    
+    When called from inside a running event loop (e.g. a FastAPI handler),
+    the coroutine is run on a dedicated worker thread with its own loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
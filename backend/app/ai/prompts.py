@@ -89,14 +89,12 @@ def format_process_for_ai(process: dict) -> str:
     if process.get('network_operations'):
         lines.append(f"Network Ops: {process['network_operations']}")
     
-    # Key accessed paths
+    # Key accessed paths (already deduplicated at detection time)
     if process.get('accessed_files'):
-        files = process['accessed_files'][:5]
-        lines.append(f"Key Files: {', '.join(files[:3])[:150]}")
+        lines.append(f"Key Files: {', '.join(process['accessed_files'][:3])[:150]}")
     
     if process.get('accessed_registry'):
-        regs = process['accessed_registry'][:5]
-        lines.append(f"Key Registry: {', '.join(regs[:3])[:150]}")
+        lines.append(f"Key Registry: {', '.join(process['accessed_registry'][:3])[:150]}")
     
     # Prior detection results
     if process.get('matched_rules'):
@@ -105,17 +103,20 @@ def format_process_for_ai(process: dict) -> str:
     return "\n".join(lines)
 
 
-def create_batch_prompt(processes: list[dict]) -> str:
-    """Create a batch analysis prompt for multiple processes."""
-    process_strs = []
-    for i, proc in enumerate(processes, 1):
-        process_strs.append(f"--- Process {i} ---")
-        process_strs.append(format_process_for_ai(proc))
-        process_strs.append("")
+def create_batch_prompt(process_strs: list[str]) -> str:
+    """
+    Create a batch analysis prompt for multiple processes.
     
-    process_data = "\n".join(process_strs)
+    Args:
+        process_strs: Processes already formatted with format_process_for_ai
+    """
+    sections = []
+    for i, proc_str in enumerate(process_strs, 1):
+        sections.append(f"--- Process {i} ---\n{proc_str}\n")
+    
+    process_data = "\n".join(sections)
     
     return BATCH_ANALYSIS_PROMPT.format(
-        count=len(processes),
+        count=len(process_strs),
         process_data=process_data
     )
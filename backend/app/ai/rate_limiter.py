@@ -4,12 +4,11 @@ Rate limiter for AI API requests.
 
 import asyncio
 import time
-from collections import deque
 from dataclasses import dataclass
 from typing import Callable
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RateLimitConfig:
     """Configuration for rate limiting."""
     requests_per_minute: int = 10
@@ -18,100 +17,122 @@ class RateLimitConfig:
     min_delay_seconds: float = 0.5
 
 
-class RateLimiter:
+class _TokenBucket:
     """
-    Token bucket rate limiter for API requests.
-    Tracks request timestamps and enforces rate limits.
+    Shared token bucket state.
+    Tracks two buckets - requests per minute and tokens per minute - each
+    holding only its current balance, so every operation is constant time.
+    A ``tokens_per_minute`` of 0 disables the token bucket.
     """
     
     def __init__(self, config: RateLimitConfig | None = None):
         self.config = config or RateLimitConfig()
-        self._request_times: deque[float] = deque(maxlen=100)
-        self._lock = asyncio.Lock()
+        self.capacity = float(max(1, self.config.requests_per_minute))
+        self.rate = self.capacity / 60.0  # requests per second
+        self.tokens = self.capacity
+        
+        self.token_capacity = float(max(0, self.config.tokens_per_minute))
+        self.token_rate = self.token_capacity / 60.0  # API tokens per second
+        self.token_bucket = self.token_capacity
+        
+        self.last_refill = time.monotonic()
+        self._next_slot = 0.0  # earliest time the next request may be sent
+    
+    def _refill(self, now: float) -> None:
+        """Add requests and API tokens accrued since the last refill."""
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.token_bucket = min(self.token_capacity, self.token_bucket + elapsed * self.token_rate)
+        self.last_refill = now
+    
+    def _available(self, now: float) -> float:
+        """Get the request count at ``now`` without mutating state."""
+        return min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
     
-    async def acquire(self) -> None:
+    def _reserve(self, now: float, estimated_tokens: int) -> float:
         """
-        Wait until a request slot is available.
-        Blocks if rate limit is exceeded.
+        Reserve one request and ``estimated_tokens`` API tokens.
+        
+        Returns the number of seconds the caller must wait before sending.
+        A negative balance is the backlog the caller has to wait out.
+        """
+        self._refill(now)
+        self.tokens -= 1.0
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        
+        if self.token_capacity > 0 and estimated_tokens > 0:
+            self.token_bucket -= estimated_tokens
+            if self.token_bucket < 0:
+                wait = max(wait, -self.token_bucket / self.token_rate)
+        
+        # Ensure minimum delay between requests
+        wait = max(wait, self._next_slot - now)
+        self._next_slot = now + wait + self.config.min_delay_seconds
+        return wait
+    
+    def charge_actual(self, token_delta: int) -> None:
         """
-        async with self._lock:
-            now = time.time()
-            window_start = now - 60.0  # 1-minute window
-            
-            # Remove old timestamps
-            while self._request_times and self._request_times[0] < window_start:
-                self._request_times.popleft()
-            
-            # Check if we're at the limit
-            if len(self._request_times) >= self.config.requests_per_minute:
-                # Calculate wait time
-                oldest = self._request_times[0]
-                wait_time = oldest - window_start
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
-            
-            # Ensure minimum delay between requests
-            if self._request_times:
-                last_request = self._request_times[-1]
-                time_since_last = now - last_request
-                if time_since_last < self.config.min_delay_seconds:
-                    await asyncio.sleep(self.config.min_delay_seconds - time_since_last)
-            
-            # Record this request
-            self._request_times.append(time.time())
+        Correct the token bucket once actual usage is known.
+        
+        Args:
+            token_delta: Actual tokens used minus the estimate passed to
+                ``acquire``. Negative values refund over-estimates.
+        """
+        if self.token_capacity <= 0:
+            return
+        self._refill(time.monotonic())
+        self.token_bucket = min(self.token_capacity, self.token_bucket - token_delta)
     
     def get_remaining_requests(self) -> int:
-        """Get the number of remaining requests in the current window."""
-        now = time.time()
-        window_start = now - 60.0
-        
-        # Count recent requests
-        recent = sum(1 for t in self._request_times if t >= window_start)
-        return max(0, self.config.requests_per_minute - recent)
+        """Get the number of requests that can be sent without waiting."""
+        return max(0, int(self._available(time.monotonic())))
+    
+    def get_token_utilization(self) -> float:
+        """Get the fraction of the tokens-per-minute budget currently in use."""
+        if self.token_capacity <= 0:
+            return 0.0
+        now = time.monotonic()
+        available = min(
+            self.token_capacity,
+            self.token_bucket + (now - self.last_refill) * self.token_rate
+        )
+        return min(1.0, max(0.0, 1.0 - available / self.token_capacity))
     
     def get_wait_time(self) -> float:
         """Get estimated wait time in seconds until next available slot."""
-        if self.get_remaining_requests() > 0:
-            return 0.0
-        
-        if not self._request_times:
-            return 0.0
-        
-        oldest = self._request_times[0]
-        now = time.time()
-        window_start = now - 60.0
+        now = time.monotonic()
+        wait = (1.0 - self._available(now)) / self.rate
+        return max(0.0, wait, self._next_slot - now)
+
+
+class RateLimiter(_TokenBucket):
+    """
+    Token bucket rate limiter for API requests.
+    Refills at ``requests_per_minute / 60`` requests and
+    ``tokens_per_minute / 60`` API tokens per second.
+    
+    Each caller reserves its share up front and then sleeps off any deficit,
+    so concurrent coroutines queue up without needing a lock.
+    """
+    
+    async def acquire(self, estimated_tokens: int = 0) -> None:
+        """
+        Wait until a request slot is available.
+        Blocks if rate limit is exceeded.
         
-        return max(0.0, oldest - window_start)
+        Args:
+            estimated_tokens: Expected prompt + completion tokens for the request
+        """
+        wait = self._reserve(time.monotonic(), estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
 
 
-class SyncRateLimiter:
+class SyncRateLimiter(_TokenBucket):
     """Synchronous rate limiter for non-async code."""
     
-    def __init__(self, config: RateLimitConfig | None = None):
-        self.config = config or RateLimitConfig()
-        self._request_times: deque[float] = deque(maxlen=100)
-    
-    def acquire(self) -> None:
+    def acquire(self, estimated_tokens: int = 0) -> None:
         """Wait until a request slot is available."""
-        now = time.time()
-        window_start = now - 60.0
-        
-        # Remove old timestamps
-        while self._request_times and self._request_times[0] < window_start:
-            self._request_times.popleft()
-        
-        # Check if we're at the limit
-        if len(self._request_times) >= self.config.requests_per_minute:
-            oldest = self._request_times[0]
-            wait_time = oldest - window_start
-            if wait_time > 0:
-                time.sleep(wait_time)
-        
-        # Ensure minimum delay
-        if self._request_times:
-            last_request = self._request_times[-1]
-            time_since_last = now - last_request
-            if time_since_last < self.config.min_delay_seconds:
-                time.sleep(self.config.min_delay_seconds - time_since_last)
-        
-        self._request_times.append(time.time())
+        wait = self._reserve(time.monotonic(), estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
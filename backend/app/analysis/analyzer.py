@@ -2,10 +2,10 @@
 Main analyzer - orchestrates parsing, detection, and AI analysis.
 """
 
+import heapq
 import logging
 import os
 import time
-from collections import defaultdict
 from pathlib import Path
 from typing import BinaryIO
 from uuid import uuid4
@@ -24,11 +24,17 @@ from app.parsers import parse_log_file, parse_log_stream
 from app.detection import DetectionEngine
 from app.ai import AIClient
 from app.analysis.process_tree import build_process_tree
-from app.analysis.timeline import generate_timeline
+from app.analysis.timeline import generate_timeline, timeline_to_dict
 
 
 logger = logging.getLogger(__name__)
 
+# Number of highest-risk processes reported as top threats
+TOP_THREATS_LIMIT = 10
+
+# Maximum entries kept per timeline (the timeline endpoint's upper limit)
+TIMELINE_MAX_ENTRIES = 500
+
 
 class Analyzer:
     """
@@ -113,58 +119,51 @@ class Analyzer:
         Returns:
             List of PathHeatmapEntry sorted by access count
         """
-        # Track access data per normalized path (directory level)
-        path_data: dict[str, dict] = defaultdict(lambda: {
-            "access_count": 0,
-            "operation_types": defaultdict(int),
-            "processes": set()
-        })
+        # Track access data per normalized path (directory level):
+        # [access_count, operation_types, processes]
+        path_data: dict[str, list] = {}
+        
+        # Raw paths repeat heavily, so normalize each distinct path only once
+        normalized_paths: dict[str, str] = {}
         
         for event in events:
-            if not event.path:
+            raw_path = event.path
+            if not raw_path:
                 continue
-                
-            # Normalize path to directory level for better aggregation
-            # For files, get the parent directory; for directories, use as-is
-            try:
-                path = event.path.strip()
-                if not path:
-                    continue
-                    
-                # Handle registry paths
-                if path.startswith("HK") or path.startswith("\\REGISTRY"):
-                    # For registry, use the key path (up to 3 levels deep for grouping)
-                    parts = path.replace("\\", "/").split("/")
-                    normalized = "/".join(parts[:min(4, len(parts))])
-                else:
-                    # For file paths, use parent directory
-                    normalized = os.path.dirname(path) or path
-                    
-                if not normalized:
-                    continue
-                    
-                path_data[normalized]["access_count"] += 1
-                path_data[normalized]["operation_types"][event.operation.value] += 1
-                if event.process_name:
-                    path_data[normalized]["processes"].add(event.process_name)
-                    
-            except Exception:
-                # Skip malformed paths
+            
+            normalized = normalized_paths.get(raw_path)
+            if normalized is None:
+                normalized = _normalize_heatmap_path(raw_path)
+                normalized_paths[raw_path] = normalized
+            
+            if not normalized:
                 continue
+            
+            entry = path_data.get(normalized)
+            if entry is None:
+                entry = path_data[normalized] = [0, {}, set()]
+            
+            entry[0] += 1
+            op_counts = entry[1]
+            op = event.operation
+            op_counts[op] = op_counts.get(op, 0) + 1
+            if event.process_name:
+                entry[2].add(event.process_name)
+        
+        # Pick the top N by access count before building models
+        # (nlargest keeps the same order as a stable descending sort)
+        top_paths = heapq.nlargest(top_n, path_data.items(), key=lambda item: item[1][0])
         
         # Convert to PathHeatmapEntry objects
-        entries = []
-        for path, data in path_data.items():
-            entries.append(PathHeatmapEntry(
+        return [
+            PathHeatmapEntry(
                 path=path,
-                access_count=data["access_count"],
-                operation_types=dict(data["operation_types"]),
-                processes=list(data["processes"])[:10]  # Limit process list
-            ))
-        
-        # Sort by access count and return top N
-        entries.sort(key=lambda x: x.access_count, reverse=True)
-        return entries[:top_n]
+                access_count=access_count,
+                operation_types=operation_types,
+                processes=list(processes)[:10]  # Limit process list
+            )
+            for path, (access_count, operation_types, processes) in top_paths
+        ]
     
     def _run_analysis(
         self,
@@ -180,11 +179,8 @@ class Analyzer:
         processes, findings = self.detection_engine.analyze_events(parsed.events)
         logger.info(f"Detection complete: {len(processes)} processes, {findings.total_findings} findings")
         
-        flagged_count = sum(1 for p in processes if p.is_flagged)
-        logger.info(f"Flagged {flagged_count} processes for further analysis")
-        
         # Step 2: AI analysis (if enabled)
-        if self.use_ai and flagged_count > 0:
+        if self.use_ai and any(p.is_flagged for p in processes):
             logger.info("Running AI analysis on flagged processes...")
             try:
                 processes = self.ai_client.analyze_processes(processes, only_flagged=True)
@@ -202,17 +198,48 @@ class Analyzer:
         path_heatmap = self._aggregate_path_heatmap(parsed.events)
         logger.info(f"Aggregated {len(path_heatmap)} path entries for heatmap")
         
-        # Step 5: Calculate summary statistics
-        high_risk = sum(1 for p in processes if p.risk_score >= 70)
-        medium_risk = sum(1 for p in processes if 30 <= p.risk_score < 70)
-        low_risk = sum(1 for p in processes if p.risk_score < 30)
+        # Step 5: Calculate summary statistics and top threats in one pass
+        high_risk = medium_risk = low_risk = flagged_count = 0
+        
+        # Min-heap of (score, -index, process); the negated index keeps the
+        # earlier process on ties, matching a stable descending sort
+        top_heap: list[tuple[int, int, ProcessInfo]] = []
         
-        # Get top threats
-        top_threats = sorted(
-            [p for p in processes if p.risk_score > 0],
-            key=lambda p: p.risk_score,
-            reverse=True
-        )[:10]
+        for index, p in enumerate(processes):
+            score = p.risk_score
+            if p.is_flagged:
+                flagged_count += 1
+            
+            if score >= 70:
+                high_risk += 1
+            elif score >= 30:
+                medium_risk += 1
+            else:
+                low_risk += 1
+            
+            if score > 0:
+                item = (score, -index, p)
+                if len(top_heap) < TOP_THREATS_LIMIT:
+                    heapq.heappush(top_heap, item)
+                elif item > top_heap[0]:
+                    heapq.heapreplace(top_heap, item)
+        
+        # (score, -index) pairs are unique, so tuples never compare processes
+        top_threats = [item[2] for item in sorted(top_heap, reverse=True)]
+        logger.info(f"Flagged {flagged_count} processes")
+        
+        # Step 6: Build event timelines (events are not kept after analysis)
+        logger.info("Generating timelines...")
+        timeline = timeline_to_dict(generate_timeline(
+            parsed.events, processes, anomalies_only=False, max_entries=TIMELINE_MAX_ENTRIES
+        ))
+        anomaly_timeline = timeline_to_dict(generate_timeline(
+            parsed.events,
+            processes,
+            anomalies_only=True,
+            max_entries=TIMELINE_MAX_ENTRIES,
+            events_by_pid=parsed.events_by_pid
+        ))
         
         # Calculate duration
         duration = time.time() - start_time
@@ -234,9 +261,33 @@ class Analyzer:
             low_risk_count=low_risk,
             path_heatmap=path_heatmap,
             top_threats=top_threats,
+            timeline=timeline,
+            anomaly_timeline=anomaly_timeline,
         )
 
 
+def _normalize_heatmap_path(path: str) -> str:
+    """
+    Normalize a path to the level used for heatmap aggregation.
+    
+    Registry keys are truncated to their first levels; file paths are
+    reduced to their parent directory. Returns an empty string for
+    paths that should be skipped.
+    """
+    path = path.strip()
+    if not path:
+        return ""
+    
+    # Handle registry paths
+    if path.startswith("HK") or path.startswith("\\REGISTRY"):
+        # For registry, use the key path (up to 3 levels deep for grouping)
+        parts = path.replace("\\", "/").split("/")
+        return "/".join(parts[:min(4, len(parts))])
+    
+    # For file paths, use parent directory
+    return os.path.dirname(path) or path
+
+
 def analyze_file(file_path: Path, use_ai: bool = True) -> AnalysisResult:
     """Convenience function to analyze a file."""
     analyzer = Analyzer(use_ai=use_ai)
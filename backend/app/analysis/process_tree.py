@@ -2,61 +2,75 @@
 Process tree builder - creates hierarchical process relationships.
 """
 
+from collections import defaultdict
+from operator import attrgetter
+
 from app.models import ProcessInfo, ProcessTreeNode
 
 
+# Sort key for tree nodes (C-level attribute lookup instead of a lambda)
+_NODE_RISK_KEY = attrgetter("process.risk_score")
+
+
+def _tree_parent_pid(process: ProcessInfo) -> int | None:
+    """
+    Get the PID a process hangs under in the tree, or None if it has none.
+    
+    A self-parented process (parent_pid == pid) is treated as having no
+    parent, so it becomes a root rather than its own child - a cycle that
+    would otherwise leave it unreachable from every root.
+    """
+    if process.parent_pid and process.parent_pid != process.pid:
+        return process.parent_pid
+    return None
+
+
 def build_process_tree(processes: list[ProcessInfo]) -> list[ProcessTreeNode]:
     """
     Build a hierarchical process tree from a flat list of processes.
     
     Returns a list of root nodes (processes without parents in our data).
     """
-    # Create PID lookup
-    pid_to_process = {p.pid: p for p in processes}
     pid_to_node: dict[int, ProcessTreeNode] = {}
+    children_by_parent: dict[int, list[ProcessTreeNode]] = defaultdict(list)
     
-    # Create nodes for all processes
+    # Create nodes and group them by parent PID in a single pass
     for process in processes:
-        pid_to_node[process.pid] = ProcessTreeNode(
+        node = ProcessTreeNode(
             process=process,
             children=[],
             depth=0
         )
-    
-    # Build parent-child relationships
-    roots: list[ProcessTreeNode] = []
-    
-    for process in processes:
-        node = pid_to_node[process.pid]
+        pid_to_node[process.pid] = node
         
-        if process.parent_pid and process.parent_pid in pid_to_node:
-            # Has a parent in our data
-            parent_node = pid_to_node[process.parent_pid]
-            parent_node.children.append(node)
-        else:
-            # Root process (no parent or parent not in data)
-            roots.append(node)
+        parent_pid = _tree_parent_pid(process)
+        if parent_pid is not None:
+            children_by_parent[parent_pid].append(node)
     
-    # Set depths
-    def set_depth(node: ProcessTreeNode, depth: int) -> None:
-        node.depth = depth
-        for child in node.children:
-            set_depth(child, depth + 1)
+    # Attach children to parents present in our data
+    for parent_pid, children in children_by_parent.items():
+        parent_node = pid_to_node.get(parent_pid)
+        if parent_node is not None:
+            parent_node.children = children
     
-    for root in roots:
-        set_depth(root, 0)
+    # Root processes (no parent, self-parented, or parent not in data)
+    roots: list[ProcessTreeNode] = [
+        node for node in pid_to_node.values()
+        if _tree_parent_pid(node.process) not in pid_to_node
+    ]
     
     # Sort roots by risk (highest first)
-    roots.sort(key=lambda n: n.process.risk_score, reverse=True)
+    roots.sort(key=_NODE_RISK_KEY, reverse=True)
     
-    # Sort children by risk within each level
-    def sort_children(node: ProcessTreeNode) -> None:
-        node.children.sort(key=lambda n: n.process.risk_score, reverse=True)
+    # Set depths and sort children by risk in a single iterative DFS
+    # (no recursion, so deep trees cannot hit the recursion limit)
+    stack: list[tuple[ProcessTreeNode, int]] = [(root, 0) for root in roots]
+    while stack:
+        node, depth = stack.pop()
+        node.depth = depth
+        node.children.sort(key=_NODE_RISK_KEY, reverse=True)
         for child in node.children:
-            sort_children(child)
-    
-    for root in roots:
-        sort_children(root)
+            stack.append((child, depth + 1))
     
     return roots
 
@@ -78,19 +92,30 @@ def flatten_tree(tree: list[ProcessTreeNode]) -> list[ProcessInfo]:
 
 def tree_to_dict(tree: list[ProcessTreeNode]) -> list[dict]:
     """Convert process tree to dictionary format for JSON serialization."""
-    def node_to_dict(node: ProcessTreeNode) -> dict:
-        return {
+    result: list[dict] = []
+    
+    # Iterative pre-order walk: each node's dict is appended to its parent's
+    # (initially empty) children list, so no recursion depth limit applies
+    stack: list[tuple[ProcessTreeNode, list[dict]]] = [
+        (root, result) for root in reversed(tree)
+    ]
+    while stack:
+        node, siblings = stack.pop()
+        process = node.process
+        children: list[dict] = []
+        siblings.append({
             "process": {
-                "pid": node.process.pid,
-                "process_name": node.process.process_name,
-                "image_path": node.process.image_path,
-                "risk_score": node.process.risk_score,
-                "legitimacy": node.process.legitimacy.value,
-                "behavior_tags": node.process.behavior_tags,
-                "event_count": node.process.event_count,
+                "pid": process.pid,
+                "process_name": process.process_name,
+                "image_path": process.image_path,
+                "risk_score": process.risk_score,
+                "legitimacy": process.legitimacy.value,
+                "behavior_tags": process.behavior_tags,
+                "event_count": process.event_count,
             },
             "depth": node.depth,
-            "children": [node_to_dict(c) for c in node.children]
-        }
+            "children": children
+        })
+        stack.extend((child, children) for child in reversed(node.children))
     
-    return [node_to_dict(root) for root in tree]
+    return result
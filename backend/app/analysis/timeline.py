@@ -2,11 +2,19 @@
 Timeline generator - creates chronological event sequences.
 """
 
+import heapq
+import re
 from datetime import datetime
-from typing import NamedTuple
+from operator import attrgetter, itemgetter
+from typing import Iterator, NamedTuple
 
 from app.models import ProcessEvent, ProcessInfo
 
+# Markers for inherently suspicious operations, each matched in one scan
+_PROCESS_CREATE_RE = re.compile(r"process (?:create|start)", re.IGNORECASE)
+_SENSITIVE_PATH_RE = re.compile(r"\\(?:sam|ntds\.dit|lsass|security|system)", re.IGNORECASE)
+_RUN_KEY_RE = re.compile(r"\\run", re.IGNORECASE)  # also covers \RunOnce
+
 
 class TimelineEntry(NamedTuple):
     """A single entry in the timeline."""
@@ -24,7 +32,8 @@ def generate_timeline(
     events: list[ProcessEvent],
     processes: list[ProcessInfo],
     anomalies_only: bool = True,
-    max_entries: int = 500
+    max_entries: int = 500,
+    events_by_pid: dict[int, list[tuple[datetime, int, ProcessEvent]]] | None = None
 ) -> list[TimelineEntry]:
     """
     Generate a timeline of events.
@@ -34,6 +43,9 @@ def generate_timeline(
         processes: Analyzed process info
         anomalies_only: If True, only include events from flagged processes
         max_entries: Maximum number of timeline entries
+        events_by_pid: Optional ``ParsedLogFile.events_by_pid``; with
+            ``anomalies_only``, only the flagged processes' lists are merged
+            instead of filtering and sorting every event
         
     Returns:
         List of timeline entries sorted by timestamp
@@ -41,13 +53,26 @@ def generate_timeline(
     # Create PID to process info lookup
     pid_to_info = {p.pid: p for p in processes}
     
-    # Filter events
-    if anomalies_only:
-        flagged_pids = {p.pid for p in processes if p.is_flagged}
-        events = [e for e in events if e.pid in flagged_pids]
-    
-    # Sort by timestamp
-    events = sorted(events, key=lambda e: e.timestamp)
+    # Filter and order events
+    ordered: Iterator[ProcessEvent]
+    if anomalies_only and events_by_pid is not None:
+        # Lazy k-way merge of the flagged processes' ordered lists; merging
+        # on (timestamp, seq) keeps file order on ties, as a stable sort would
+        ordered = map(itemgetter(2), heapq.merge(
+            *(
+                events_by_pid[p.pid]
+                for p in processes
+                if p.is_flagged and p.pid in events_by_pid
+            )
+        ))
+    else:
+        if anomalies_only:
+            flagged_pids = {p.pid for p in processes if p.is_flagged}
+            events = [e for e in events if e.pid in flagged_pids]
+        
+        # Sort by timestamp, lazily: grouping collapses repeats, so the
+        # loop usually stops long before every event has been ordered
+        ordered = _timestamp_ordered(events, head=max_entries * 4)
     
     # Generate entries
     entries: list[TimelineEntry] = []
@@ -56,35 +81,29 @@ def generate_timeline(
     prev_key = None
     group_count = 0
     
-    for event in events:
-        process_info = pid_to_info.get(event.pid)
-        risk = process_info.risk_score if process_info else 0
-        is_flagged = process_info.is_flagged if process_info else False
-        
-        # Create grouping key to avoid duplicate entries
+    for event in ordered:
+        # Create grouping key to avoid duplicate entries; repeats are only
+        # counted, so check this before any per-event work
         key = (event.pid, event.operation, event.path[:100] if event.path else "")
         
         if key == prev_key:
             group_count += 1
             continue
         
-        # Add previous group if it had multiple events
-        if prev_key and group_count > 1 and entries:
-            last = entries[-1]
-            entries[-1] = TimelineEntry(
-                timestamp=last.timestamp,
-                process_name=last.process_name,
-                pid=last.pid,
-                operation=f"{last.operation} (x{group_count})",
-                path=last.path,
-                risk_score=last.risk_score,
-                is_anomaly=last.is_anomaly,
-                description=last.description
-            )
+        # Annotate previous group if it had multiple events
+        if group_count > 1:
+            _annotate_group(entries, group_count)
+        
+        if len(entries) >= max_entries:
+            group_count = 0
+            break
         
         prev_key = key
         group_count = 1
         
+        process_info = pid_to_info.get(event.pid)
+        risk = process_info.risk_score if process_info else 0
+        
         # Determine if this is an anomaly
         is_anomaly = risk >= 20 or _is_suspicious_operation(event)
         
@@ -101,29 +120,49 @@ def generate_timeline(
             is_anomaly=is_anomaly,
             description=description
         ))
-        
-        if len(entries) >= max_entries:
-            break
+    
+    # Annotate the trailing group
+    if group_count > 1:
+        _annotate_group(entries, group_count)
     
     return entries
 
 
+def _timestamp_ordered(events: list[ProcessEvent], head: int) -> Iterator[ProcessEvent]:
+    """
+    Yield events in timestamp order, selecting only the first ``head`` up front.
+    
+    ``heapq.nsmallest`` is O(N log head) and matches ``sorted(...)[:head]``
+    exactly, ties included. The rest is sorted only if the caller keeps
+    iterating past the head.
+    """
+    by_timestamp = attrgetter("timestamp")
+    yield from heapq.nsmallest(head, events, key=by_timestamp)
+    if len(events) > head:
+        yield from sorted(events, key=by_timestamp)[head:]
+
+
+def _annotate_group(entries: list[TimelineEntry], group_count: int) -> None:
+    """Mark the last entry as standing for ``group_count`` repeated events."""
+    last = entries[-1]
+    entries[-1] = last._replace(operation=f"{last.operation} (x{group_count})")
+
+
 def _is_suspicious_operation(event: ProcessEvent) -> bool:
     """Check if an operation is inherently suspicious."""
-    op_lower = event.operation.lower() if event.operation else ""
-    path_lower = event.path.lower() if event.path else ""
+    op = event.operation or ""
+    path = event.path or ""
     
     # Process creation is always notable
-    if "process create" in op_lower or "process start" in op_lower:
+    if _PROCESS_CREATE_RE.search(op):
         return True
     
     # Sensitive file access
-    sensitive_paths = ["\\sam", "\\ntds.dit", "\\lsass", "\\security", "\\system"]
-    if any(sp in path_lower for sp in sensitive_paths):
+    if _SENSITIVE_PATH_RE.search(path):
         return True
     
     # Run key registry access
-    if "reg" in op_lower and ("\\run" in path_lower or "\\runonce" in path_lower):
+    if "reg" in event.operation_lower and _RUN_KEY_RE.search(path):
         return True
     
     return False
@@ -132,22 +171,26 @@ def _is_suspicious_operation(event: ProcessEvent) -> bool:
 def _create_description(event: ProcessEvent, process_info: ProcessInfo | None) -> str:
     """Create a human-readable description for a timeline entry."""
     op = event.operation or "Unknown operation"
+    op_lower = event.operation_lower
     name = event.process_name
     
-    if "process create" in op.lower() or "process start" in op.lower():
-        return f"{name} created a new process: {event.path.split(chr(92))[-1] if event.path else 'unknown'}"
-    elif "reg" in op.lower() and event.path:
-        key = event.path.split("\\")[-1] if event.path else "unknown key"
-        return f"{name} accessed registry: {key}"
-    elif "file" in op.lower() and event.path:
-        file = event.path.split("\\")[-1] if event.path else "unknown file"
-        return f"{name} {op}: {file}"
-    elif "tcp" in op.lower() or "udp" in op.lower():
+    if "process create" in op_lower or "process start" in op_lower:
+        return f"{name} created a new process: {_basename(event.path)}"
+    elif "reg" in op_lower and event.path:
+        return f"{name} accessed registry: {_basename(event.path)}"
+    elif "file" in op_lower and event.path:
+        return f"{name} {op}: {_basename(event.path)}"
+    elif "tcp" in op_lower or "udp" in op_lower:
         return f"{name} network activity: {event.path or 'unknown destination'}"
     else:
         return f"{name}: {op}"
 
 
+def _basename(path: str) -> str:
+    """Get the last backslash-separated segment of a path."""
+    return path.rpartition("\\")[2] if path else "unknown"
+
+
 def timeline_to_dict(entries: list[TimelineEntry]) -> list[dict]:
     """Convert timeline entries to dictionary format."""
     return [
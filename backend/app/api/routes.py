@@ -2,18 +2,21 @@
 API routes for ProcBench backend.
 """
 
+import asyncio
 import io
 import logging
+import time
+from collections import OrderedDict
 from typing import Any
 from uuid import uuid4
 
 from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.responses import JSONResponse, Response
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from app.config import settings
-from app.report import PDFGenerator
-from app.analysis import Analyzer, generate_timeline, timeline_to_dict, tree_to_dict
+from app.analysis import Analyzer, tree_to_dict
+from app.models import ProcessInfo
 from app.parsers import ParserFactory
 
 
@@ -21,8 +24,93 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["analysis"])
 
+# Process lists are dumped in one pydantic-core pass, keeping only these fields
+_PROCESS_LIST_ADAPTER = TypeAdapter(list[ProcessInfo])
+_TOP_THREAT_FIELDS = {
+    "pid", "process_name", "image_path", "risk_score", "legitimacy",
+    "behavior_tags", "ai_reasoning", "matched_rules",
+}
+_PROCESS_LIST_FIELDS = {
+    "pid", "process_name", "image_path", "command_line", "parent_pid",
+    "parent_name", "risk_score", "legitimacy", "behavior_tags", "is_flagged",
+    "matched_rules", "ai_reasoning", "event_count", "file_operations",
+    "registry_operations", "network_operations",
+}
+
+# Summary statistics and top threats passed to the PDF report
+_REPORT_SUMMARY_INCLUDE = {
+    "total_events": True,
+    "total_processes": True,
+    "flagged_processes": True,
+    "high_risk_count": True,
+    "medium_risk_count": True,
+    "low_risk_count": True,
+    "analysis_duration_seconds": True,
+    "top_threats": {"__all__": _TOP_THREAT_FIELDS},
+}
+
+
+class _AnalysisCache:
+    """
+    In-memory analysis results, bounded by count and age.
+    
+    Entries are kept in least-recently-used order. A lookup checks only the
+    requested entry's age, treating an expired one as missing, and marks it
+    as recently used; expired entries are also popped from the front while
+    the oldest there is stale. Inserts then drop least recently used entries
+    beyond ``maxsize``. Every operation is amortized O(1).
+    """
+    
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl_seconds = ttl_seconds
+        # key -> (inserted_at, value), least recently used first
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        self._expire_front(now)
+        item = self._entries.get(key)
+        if item is None:
+            return default
+        if now - item[0] > self.ttl_seconds:
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return item[1]
+    
+    def __setitem__(self, key: str, value: dict[str, Any]) -> None:
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = (now, value)
+        self._expire_front(now)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def pop(self, key: str, default: Any = None) -> Any:
+        item = self._entries.pop(key, None)
+        if item is None or time.monotonic() - item[0] > self.ttl_seconds:
+            return default
+        return item[1]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _expire_front(self, now: float) -> None:
+        """Pop least recently used entries while they are expired."""
+        entries = self._entries
+        while entries:
+            inserted_at = next(iter(entries.values()))[0]
+            if now - inserted_at <= self.ttl_seconds:
+                break
+            entries.popitem(last=False)
+
+
 # In-memory storage for analysis results (would be Redis/DB in production)
-_analysis_cache: dict[str, dict[str, Any]] = {}
+_analysis_cache = _AnalysisCache(
+    maxsize=settings.analysis_cache_size,
+    ttl_seconds=settings.analysis_cache_ttl_seconds
+)
 
 
 # Response Models
@@ -68,6 +156,13 @@ class HealthResponse(BaseModel):
     ai_enabled: bool
 
 
+def _dump_processes(processes: list[ProcessInfo], fields: set[str]) -> list[dict]:
+    """Dump processes to JSON-ready dicts holding only ``fields``."""
+    return _PROCESS_LIST_ADAPTER.dump_python(
+        processes, mode="json", include={"__all__": fields}
+    )
+
+
 # Routes
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -106,9 +201,12 @@ async def analyze_file(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Check file size
-    content = await file.read()
-    file_size = len(content)
+    # Check file size; the upload is already spooled by Starlette, so
+    # measure it in place instead of reading it all into memory
+    file_stream = file.file
+    file_stream.seek(0, io.SEEK_END)
+    file_size = file_stream.tell()
+    file_stream.seek(0)
     
     if file_size > settings.max_file_size_bytes:
         raise HTTPException(
@@ -119,37 +217,39 @@ async def analyze_file(
     # Generate analysis ID
     analysis_id = f"ANL-{uuid4().hex[:12].upper()}"
     
-    # Initialize cache entry
-    _analysis_cache[analysis_id] = {
+    # Initialize cache entry; keep a reference so updates still land if
+    # the entry is evicted while the analysis runs
+    entry: dict[str, Any] = {
         "status": "processing",
         "progress": 0,
         "filename": file.filename,
         "result": None,
         "error": None
     }
+    _analysis_cache[analysis_id] = entry
     
     # Run analysis
     try:
         logger.info(f"Starting analysis {analysis_id} for {file.filename}")
         
         analyzer = Analyzer(use_ai=True)
-        file_stream = io.BytesIO(content)
-        result = analyzer.analyze_stream(file_stream, file.filename)
+        # Parsing and detection are blocking; keep them off the event loop
+        result = await asyncio.to_thread(analyzer.analyze_stream, file_stream, file.filename)
         
         # Override the analysis_id to match our cache key
         result.analysis_id = analysis_id
         
         # Store result
-        _analysis_cache[analysis_id]["status"] = "completed"
-        _analysis_cache[analysis_id]["progress"] = 100
-        _analysis_cache[analysis_id]["result"] = result
+        entry["status"] = "completed"
+        entry["progress"] = 100
+        entry["result"] = result
         
         logger.info(f"Analysis {analysis_id} completed successfully")
         
     except Exception as e:
         logger.error(f"Analysis {analysis_id} failed: {e}")
-        _analysis_cache[analysis_id]["status"] = "failed"
-        _analysis_cache[analysis_id]["error"] = str(e)
+        entry["status"] = "failed"
+        entry["error"] = str(e)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     
     return AnalysisStartResponse(
@@ -162,11 +262,10 @@ async def analyze_file(
 @router.get("/analysis/{analysis_id}")
 async def get_analysis(analysis_id: str):
     """Get the full analysis result."""
-    if analysis_id not in _analysis_cache:
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    cache = _analysis_cache[analysis_id]
-    
     if cache["status"] == "failed":
         raise HTTPException(status_code=500, detail=cache["error"])
     
@@ -186,30 +285,17 @@ async def get_analysis(analysis_id: str):
         "medium_risk_count": result.medium_risk_count,
         "low_risk_count": result.low_risk_count,
         "analysis_duration_seconds": result.analysis_duration_seconds,
-        "top_threats": [
-            {
-                "pid": p.pid,
-                "process_name": p.process_name,
-                "image_path": p.image_path,
-                "risk_score": p.risk_score,
-                "legitimacy": p.legitimacy.value,
-                "behavior_tags": p.behavior_tags,
-                "ai_reasoning": p.ai_reasoning,
-                "matched_rules": p.matched_rules,
-            }
-            for p in result.top_threats
-        ]
+        "top_threats": _dump_processes(result.top_threats, _TOP_THREAT_FIELDS)
     }
 
 
 @router.get("/analysis/{analysis_id}/processes")
 async def get_processes(analysis_id: str, flagged_only: bool = False):
     """Get list of processes from an analysis."""
-    if analysis_id not in _analysis_cache:
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    cache = _analysis_cache[analysis_id]
-    
     if cache["status"] != "completed":
         raise HTTPException(status_code=400, detail="Analysis not completed")
     
@@ -226,38 +312,17 @@ async def get_processes(analysis_id: str, flagged_only: bool = False):
     return {
         "total": len(processes),
         "flagged": flagged_count,
-        "processes": [
-            {
-                "pid": p.pid,
-                "process_name": p.process_name,
-                "image_path": p.image_path,
-                "command_line": p.command_line,
-                "parent_pid": p.parent_pid,
-                "parent_name": p.parent_name,
-                "risk_score": p.risk_score,
-                "legitimacy": p.legitimacy.value,
-                "behavior_tags": p.behavior_tags,
-                "is_flagged": p.is_flagged,
-                "matched_rules": p.matched_rules,
-                "ai_reasoning": p.ai_reasoning,
-                "event_count": p.event_count,
-                "file_operations": p.file_operations,
-                "registry_operations": p.registry_operations,
-                "network_operations": p.network_operations,
-            }
-            for p in processes
-        ]
+        "processes": _dump_processes(processes, _PROCESS_LIST_FIELDS)
     }
 
 
 @router.get("/analysis/{analysis_id}/tree")
 async def get_process_tree(analysis_id: str):
     """Get process tree from an analysis."""
-    if analysis_id not in _analysis_cache:
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    cache = _analysis_cache[analysis_id]
-    
     if cache["status"] != "completed":
         raise HTTPException(status_code=400, detail="Analysis not completed")
     
@@ -270,32 +335,27 @@ async def get_process_tree(analysis_id: str):
 
 @router.get("/analysis/{analysis_id}/timeline")
 async def get_timeline(analysis_id: str, anomalies_only: bool = True, limit: int = 200):
-    """Get timeline of events from an analysis."""
-    if analysis_id not in _analysis_cache:
-        raise HTTPException(status_code=404, detail="Analysis not found")
+    """
+    Get timeline of events from an analysis.
     
-    cache = _analysis_cache[analysis_id]
+    Args:
+        analysis_id: Analysis ID
+        anomalies_only: Only include events from flagged processes (default True)
+        limit: Maximum number of entries to return (default 200, at most 500)
+    """
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
     if cache["status"] != "completed":
         raise HTTPException(status_code=400, detail="Analysis not completed")
     
-    # We need to regenerate timeline from cached events
-    # In production, this would be stored or computed differently
-    # For now, return a simplified timeline based on processes
-    
     result = cache["result"]
     
-    # Create simplified timeline from top threats
-    timeline = []
-    for proc in result.top_threats[:limit]:
-        timeline.append({
-            "timestamp": None,  # Would need event data
-            "process_name": proc.process_name,
-            "pid": proc.pid,
-            "risk_score": proc.risk_score,
-            "is_anomaly": proc.is_flagged,
-            "description": proc.ai_reasoning or f"Process: {proc.process_name}",
-        })
+    # Timelines are generated during analysis, since events are not cached;
+    # a prefix of the longer timeline equals a timeline built with that limit
+    source = result.anomaly_timeline if anomalies_only else result.timeline
+    timeline = source[:max(0, limit)]
     
     return {
         "total": len(timeline),
@@ -320,11 +380,10 @@ async def get_path_heatmap(
     Returns:
         Path heatmap data for visualization
     """
-    if analysis_id not in _analysis_cache:
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    cache = _analysis_cache[analysis_id]
-    
     if cache["status"] != "completed":
         raise HTTPException(status_code=400, detail="Analysis not completed")
     
@@ -356,22 +415,19 @@ async def get_path_heatmap(
 @router.delete("/analysis/{analysis_id}")
 async def delete_analysis(analysis_id: str):
     """Delete an analysis result."""
-    if analysis_id not in _analysis_cache:
+    if _analysis_cache.pop(analysis_id) is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    del _analysis_cache[analysis_id]
-    
     return {"status": "deleted", "analysis_id": analysis_id}
 
 
 @router.get("/analysis/{analysis_id}/report")
 async def get_pdf_report(analysis_id: str):
     """Generate and download PDF report for an analysis."""
-    if analysis_id not in _analysis_cache:
+    cache = _analysis_cache.get(analysis_id)
+    if cache is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    cache = _analysis_cache[analysis_id]
-    
     if cache["status"] != "completed":
         raise HTTPException(status_code=400, detail="Analysis not completed")
     
@@ -382,29 +438,12 @@ async def get_pdf_report(analysis_id: str):
         "analysis_id": analysis_id,
         "filename": cache.get("filename", "Unknown"),
         "status": "completed",
-        "total_events": result.total_events,
-        "total_processes": result.total_processes,
-        "flagged_processes": result.flagged_processes,
-        "high_risk_count": result.high_risk_count,
-        "medium_risk_count": result.medium_risk_count,
-        "low_risk_count": result.low_risk_count,
-        "analysis_duration_seconds": result.analysis_duration_seconds,
-        "top_threats": [
-            {
-                "pid": p.pid,
-                "process_name": p.process_name,
-                "image_path": p.image_path,
-                "risk_score": p.risk_score,
-                "legitimacy": p.legitimacy,
-                "behavior_tags": list(p.behavior_tags),
-                "matched_rules": list(p.matched_rules),
-                "ai_reasoning": p.ai_reasoning,
-            }
-            for p in result.top_threats
-        ],
+        **result.model_dump(mode="json", include=_REPORT_SUMMARY_INCLUDE),
     }
     
-    # Generate PDF
+    # Generate PDF; reportlab is imported on first use to keep it out of startup
+    from app.report import PDFGenerator
+    
     generator = PDFGenerator()
     pdf_bytes = generator.generate(analysis_summary)
     
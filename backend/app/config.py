@@ -25,17 +25,34 @@ class Settings(BaseSettings):
     )
     openai_api_key: str = Field(default="", alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4", alias="OPENAI_MODEL")
+    openai_context_window: int = Field(default=8192, alias="OPENAI_CONTEXT_WINDOW")
     
     # Rate limiting
     ai_rate_limit_requests: int = Field(default=10, alias="AI_RATE_LIMIT_REQUESTS")
+    ai_rate_limit_tokens: int = Field(default=10000, alias="AI_RATE_LIMIT_TOKENS")
     ai_batch_size: int = Field(default=15, alias="AI_BATCH_SIZE")
-    ai_timeout_seconds: int = Field(default=30, alias="AI_TIMEOUT_SECONDS")
+    ai_concurrency: int = Field(default=5, alias="AI_CONCURRENCY")
+    ai_max_processes: int = Field(default=200, alias="AI_MAX_PROCESSES")
+    ai_timeout_seconds: int = Field(default=60, alias="AI_TIMEOUT_SECONDS")
     ai_max_retries: int = Field(default=3, alias="AI_MAX_RETRIES")
+    ai_json_mode: bool = Field(default=True, alias="AI_JSON_MODE")
+    ai_prompt_cache_control: bool = Field(default=False, alias="AI_PROMPT_CACHE_CONTROL")
+    
+    # AI response cache (keyed by model + prompt hash)
+    ai_cache_enabled: bool = Field(default=False, alias="AI_CACHE_ENABLED")
+    ai_cache_dir: Path = Field(
+        default=Path.home() / ".cache" / "procbench" / "ai",
+        alias="AI_CACHE_DIR"
+    )
     
     # File limits
     max_file_size_mb: int = Field(default=500, alias="MAX_FILE_SIZE_MB")
     max_concurrent_analyses: int = Field(default=10, alias="MAX_CONCURRENT_ANALYSES")
     
+    # In-memory analysis results
+    analysis_cache_size: int = Field(default=40, alias="ANALYSIS_CACHE_SIZE")
+    analysis_cache_ttl_seconds: int = Field(default=3600, alias="ANALYSIS_CACHE_TTL_SECONDS")
+    
     # Paths
     rules_path: Path = Field(
         default=Path(__file__).parent.parent / "rules",
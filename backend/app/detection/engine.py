@@ -2,7 +2,9 @@
 Detection engine - orchestrates all detection modules.
 """
 
+import re
 from collections import Counter, defaultdict
+from itertools import count
 from uuid import uuid4
 
 from app.models import (
@@ -14,11 +16,41 @@ from app.models import (
     FindingType,
     LegitimacyStatus,
 )
-from app.detection.lolbas import is_lolbas, get_lolbas_info, get_lolbas_risk
+from app.detection.lolbas import get_lolbas_info
 from app.detection.suspicious import analyze_path, analyze_file_access
 from app.detection.parent_child import analyze_parent_child
 
 
+# Operation category by raw operation string. Procmon operations come from a
+# small fixed vocabulary, so each distinct string is classified only once.
+_OPERATION_CATEGORIES: dict[str, str] = {}
+_MAX_OPERATION_CATEGORIES = 1024
+
+# Registry keys used for persistence ("run" also covers RunOnce)
+_PERSISTENCE_KEY_RE = re.compile(r"run|startup", re.IGNORECASE)
+
+
+def _classify_operation(operation: str) -> str:
+    """Classify an operation as file, registry, network, process or other."""
+    op = operation.lower() if operation else ""
+    
+    if "file" in op or "directory" in op:
+        category = "file"
+    elif "reg" in op:
+        category = "registry"
+    elif "tcp" in op or "udp" in op or "network" in op:
+        category = "network"
+    elif "process" in op or "thread" in op:
+        category = "process"
+    else:
+        category = "other"
+    
+    # Bound the memo in case a malformed log has free-form operations
+    if len(_OPERATION_CATEGORIES) < _MAX_OPERATION_CATEGORIES:
+        _OPERATION_CATEGORIES[operation] = category
+    return category
+
+
 class DetectionEngine:
     """
     Rule-based detection engine for Process Monitor logs.
@@ -29,6 +61,10 @@ class DetectionEngine:
         self.findings: list[Finding] = []
         self.process_risks: dict[str, int] = {}  # pid -> risk score
         self.process_flags: dict[str, list[str]] = defaultdict(list)  # pid -> reasons
+        
+        # Finding IDs: one random prefix per engine plus a running counter
+        self._finding_prefix = uuid4().hex[:4].upper()
+        self._finding_ids = count(1)
     
     def analyze_events(self, events: list[ProcessEvent]) -> tuple[list[ProcessInfo], FindingSummary]:
         """
@@ -57,7 +93,7 @@ class DetectionEngine:
             process_infos.append(process_info)
         
         # Build parent-child relationships
-        self._build_relationships(process_infos, events)
+        self._build_relationships(process_infos)
         
         # Generate finding summary
         summary = self._build_summary()
@@ -74,33 +110,32 @@ class DetectionEngine:
         network_ops = 0
         process_ops = 0
         
-        accessed_files: list[str] = []
-        accessed_registry: list[str] = []
-        network_connections: list[str] = []
+        # Unique paths in first-seen order; dicts double as ordered sets and
+        # stop growing once their cap is reached
+        accessed_files: dict[str, None] = {}
+        accessed_registry: dict[str, None] = {}
+        network_connections: dict[str, None] = {}
         
         for event in events:
-            op = event.operation.lower() if event.operation else ""
+            category = _OPERATION_CATEGORIES.get(event.operation)
+            if category is None:
+                category = _classify_operation(event.operation)
             
-            if "file" in op or "directory" in op:
+            if category == "file":
                 file_ops += 1
-                if event.path and len(accessed_files) < 50:
-                    accessed_files.append(event.path)
-            elif "reg" in op:
+                if event.path and len(accessed_files) < 20:
+                    accessed_files[event.path] = None
+            elif category == "registry":
                 registry_ops += 1
-                if event.path and len(accessed_registry) < 50:
-                    accessed_registry.append(event.path)
-            elif "tcp" in op or "udp" in op or "network" in op:
+                if event.path and len(accessed_registry) < 20:
+                    accessed_registry[event.path] = None
+            elif category == "network":
                 network_ops += 1
-                if event.path and len(network_connections) < 20:
-                    network_connections.append(event.path)
-            elif "process" in op or "thread" in op:
+                if event.path and len(network_connections) < 10:
+                    network_connections[event.path] = None
+            elif category == "process":
                 process_ops += 1
         
-        # Deduplicate paths (keep unique, preserve order)
-        accessed_files = list(dict.fromkeys(accessed_files))[:20]
-        accessed_registry = list(dict.fromkeys(accessed_registry))[:20]
-        network_connections = list(dict.fromkeys(network_connections))[:10]
-        
         return ProcessInfo(
             pid=pid,
             process_name=first_event.process_name,
@@ -116,9 +151,9 @@ class DetectionEngine:
             registry_operations=registry_ops,
             network_operations=network_ops,
             process_operations=process_ops,
-            accessed_files=accessed_files,
-            accessed_registry=accessed_registry,
-            network_connections=network_connections,
+            accessed_files=list(accessed_files),
+            accessed_registry=list(accessed_registry),
+            network_connections=list(network_connections),
         )
     
     def _analyze_process(self, process: ProcessInfo, events: list[ProcessEvent]) -> None:
@@ -128,10 +163,10 @@ class DetectionEngine:
         behavior_tags: list[str] = []
         
         # Check for LOLBAS
-        if is_lolbas(process.process_name):
-            lolbas_info = get_lolbas_info(process.process_name)
-            risk_score += get_lolbas_risk(process.process_name)
-            matched_rules.append(f"lolbas:{process.process_name.lower()}")
+        lolbas_info = get_lolbas_info(process.process_name)
+        if lolbas_info:
+            risk_score += lolbas_info["risk_increase"]
+            matched_rules.append(f"lolbas:{lolbas_info['name']}")
             
             self._add_finding(
                 finding_type=FindingType.LOLBAS,
@@ -139,7 +174,7 @@ class DetectionEngine:
                 process=process,
                 title=f"LOLBAS Binary: {process.process_name}",
                 description=f"{process.process_name} is a Living Off The Land binary. " +
-                           f"{lolbas_info['description'] if lolbas_info else 'Could be abused by attackers.'}",
+                           f"{lolbas_info['description']}",
                 evidence=[f"Process path: {process.image_path or 'Unknown'}"],
             )
         
@@ -178,8 +213,7 @@ class DetectionEngine:
         
         # Check registry access for persistence
         for reg_path in process.accessed_registry:
-            reg_lower = reg_path.lower()
-            if any(key in reg_lower for key in ["run", "runonce", "startup"]):
+            if _PERSISTENCE_KEY_RE.search(reg_path):
                 risk_score += 15
                 if "persistence" not in behavior_tags:
                     behavior_tags.append("persistence")
@@ -199,10 +233,8 @@ class DetectionEngine:
         else:
             process.legitimacy = LegitimacyStatus.UNKNOWN
     
-    def _build_relationships(
-        self, processes: list[ProcessInfo], events: list[ProcessEvent]
-    ) -> None:
-        """Build parent-child relationships between processes."""
+    def _build_relationships(self, processes: list[ProcessInfo]) -> None:
+        """Build parent-child relationships between processes (O(processes))."""
         pid_to_process = {p.pid: p for p in processes}
         
         # Find parent names
@@ -245,7 +277,7 @@ class DetectionEngine:
     ) -> None:
         """Add a finding to the list."""
         finding = Finding(
-            id=f"FND-{uuid4().hex[:8].upper()}",
+            id=f"FND-{self._finding_prefix}{next(self._finding_ids):04X}",
             type=finding_type,
             severity=severity,
             process_name=process.process_name,
@@ -270,25 +302,20 @@ class DetectionEngine:
     
     def _build_summary(self) -> FindingSummary:
         """Build a summary of all findings."""
-        critical_count = sum(1 for f in self.findings if f.severity == Severity.CRITICAL)
-        high_count = sum(1 for f in self.findings if f.severity == Severity.HIGH)
-        medium_count = sum(1 for f in self.findings if f.severity == Severity.MEDIUM)
-        low_count = sum(1 for f in self.findings if f.severity == Severity.LOW)
-        info_count = sum(1 for f in self.findings if f.severity == Severity.INFO)
-        
-        # Count by type
-        findings_by_type: dict[str, int] = {}
+        # Count by severity and by type in one pass
+        severity_counts: Counter[Severity] = Counter()
+        findings_by_type: Counter[str] = Counter()
         for finding in self.findings:
-            type_str = finding.type.value
-            findings_by_type[type_str] = findings_by_type.get(type_str, 0) + 1
+            severity_counts[finding.severity] += 1
+            findings_by_type[finding.type.value] += 1
         
         return FindingSummary(
             total_findings=len(self.findings),
-            critical_count=critical_count,
-            high_count=high_count,
-            medium_count=medium_count,
-            low_count=low_count,
-            info_count=info_count,
+            critical_count=severity_counts[Severity.CRITICAL],
+            high_count=severity_counts[Severity.HIGH],
+            medium_count=severity_counts[Severity.MEDIUM],
+            low_count=severity_counts[Severity.LOW],
+            info_count=severity_counts[Severity.INFO],
             findings=self.findings,
-            findings_by_type=findings_by_type,
+            findings_by_type=dict(findings_by_type),
         )
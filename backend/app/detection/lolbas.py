@@ -2,7 +2,11 @@
 LOLBAS (Living Off The Land Binaries and Scripts) detection.
 """
 
-# LOLBAS binaries that are commonly abused by attackers
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
+
+# LOLBAS binaries that are commonly abused by attackers (lowercase keys)
 LOLBAS_BINARIES = {
     # Command interpreters
     "cmd.exe": {
@@ -235,11 +239,6 @@ LOLBAS_BINARIES = {
         "description": "Diagnostics Troubleshooter",
         "suspicious_when": ["any execution", "Follina vulnerability"]
     },
-    "msiexec.exe": {
-        "risk_increase": 15,
-        "description": "Windows Installer",
-        "suspicious_when": ["remote MSI", "quiet install"]
-    },
     "odbcconf.exe": {
         "risk_increase": 25,
         "description": "ODBC Configuration",
@@ -340,11 +339,6 @@ LOLBAS_BINARIES = {
         "description": "WLR Reminder",
         "suspicious_when": ["any execution"]
     },
-    "wmic.exe": {
-        "risk_increase": 15,
-        "description": "WMI Command-line",
-        "suspicious_when": ["process creation", "remote execution"]
-    },
     "workfolders.exe": {
         "risk_increase": 20,
         "description": "Work Folders",
@@ -367,22 +361,25 @@ LOLBAS_BINARIES = {
     },
 }
 
+# Read-only info per binary with its name included, built once so lookups
+# can return a shared mapping instead of copying the entry every call
+_LOLBAS_INFO: dict[str, Mapping[str, Any]] = {
+    name: MappingProxyType({**info, "name": name})
+    for name, info in LOLBAS_BINARIES.items()
+}
+
 
 def is_lolbas(process_name: str) -> bool:
     """Check if a process is a known LOLBAS binary."""
-    return process_name.lower() in [k.lower() for k in LOLBAS_BINARIES.keys()]
+    return process_name.lower() in LOLBAS_BINARIES
 
 
-def get_lolbas_info(process_name: str) -> dict | None:
-    """Get LOLBAS information for a process."""
-    name_lower = process_name.lower()
-    for name, info in LOLBAS_BINARIES.items():
-        if name.lower() == name_lower:
-            return {**info, "name": name}
-    return None
+def get_lolbas_info(process_name: str) -> Mapping[str, Any] | None:
+    """Get read-only LOLBAS information for a process."""
+    return _LOLBAS_INFO.get(process_name.lower())
 
 
 def get_lolbas_risk(process_name: str) -> int:
     """Get the risk increase for a LOLBAS binary."""
-    info = get_lolbas_info(process_name)
+    info = LOLBAS_BINARIES.get(process_name.lower())
     return info["risk_increase"] if info else 0
@@ -106,6 +106,35 @@ SUSPICIOUS_COMBINATIONS = [
 ]
 
 
+def _index_by_parent(
+    combinations: list[tuple[str, str, int, str]]
+) -> dict[str, dict[str, tuple[int, str]]]:
+    """
+    Index combinations as parent -> child -> (risk, description), lowercased.
+    
+    Most parents are benign and absent, so a check usually ends after one
+    failed lookup. Built in reverse so the first entry wins on duplicates.
+    """
+    by_parent: dict[str, dict[str, tuple[int, str]]] = {}
+    for parent, child, risk, description in reversed(combinations):
+        by_parent.setdefault(parent.lower(), {})[child.lower()] = (risk, description)
+    return by_parent
+
+
+_SUSPICIOUS_BY_PARENT = _index_by_parent(SUSPICIOUS_COMBINATIONS)
+
+# Lowercased child -> allowed lowercased parents, for O(1) membership checks
+_EXPECTED_PARENT_SETS: dict[str, frozenset[str]] = {
+    child.lower(): frozenset(parent.lower() for parent in parents)
+    for child, parents in EXPECTED_PARENTS.items()
+}
+
+# Lowercased child -> preformatted list of expected parents for reasons
+_EXPECTED_PARENT_TEXT: dict[str, str] = {
+    child.lower(): ", ".join(parents) for child, parents in EXPECTED_PARENTS.items()
+}
+
+
 def check_parent_child(parent_name: str | None, child_name: str) -> tuple[int, str | None]:
     """
     Check if a parent-child relationship is suspicious.
@@ -115,14 +144,11 @@ def check_parent_child(parent_name: str | None, child_name: str) -> tuple[int, s
     if not parent_name:
         return 0, None
     
-    parent_lower = parent_name.lower()
-    child_lower = child_name.lower()
-    
-    for parent, child, risk, description in SUSPICIOUS_COMBINATIONS:
-        if parent_lower == parent.lower() and child_lower == child.lower():
-            return risk, description
+    children = _SUSPICIOUS_BY_PARENT.get(parent_name.lower())
+    if children is None:
+        return 0, None
     
-    return 0, None
+    return children.get(child_name.lower(), (0, None))
 
 
 def check_unexpected_parent(child_name: str, parent_name: str | None) -> tuple[int, str | None]:
@@ -137,10 +163,9 @@ def check_unexpected_parent(child_name: str, parent_name: str | None) -> tuple[i
     child_lower = child_name.lower()
     parent_lower = parent_name.lower()
     
-    if child_lower in EXPECTED_PARENTS:
-        expected = [p.lower() for p in EXPECTED_PARENTS[child_lower]]
-        if parent_lower not in expected:
-            return 25, f"{child_name} has unexpected parent {parent_name} (expected: {', '.join(EXPECTED_PARENTS[child_lower])})"
+    allowed = _EXPECTED_PARENT_SETS.get(child_lower)
+    if allowed is not None and parent_lower not in allowed:
+        return 25, f"{child_name} has unexpected parent {parent_name} (expected: {_EXPECTED_PARENT_TEXT[child_lower]})"
     
     return 0, None
 
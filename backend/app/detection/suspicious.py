@@ -3,6 +3,7 @@ Suspicious path detection module.
 """
 
 import re
+from functools import lru_cache
 from pathlib import PureWindowsPath
 
 
@@ -78,6 +79,25 @@ SUSPICIOUS_FILE_ACCESS = [
     (r"\\\\\\?\\globalroot\\device\\harddiskvolumeshadowcopy", 30, "Shadow copy access", "credential_access"),
 ]
 
+# Precompiled forms of the tables above. Most paths match nothing, so a
+# single combined alternation rejects them in one scan before the
+# individual patterns are tried in table order. Patterns are all lowercase
+# and paths are lowercased before matching, so no IGNORECASE is needed.
+_SUSPICIOUS_PATH_RES = [
+    (re.compile(pattern), score, description)
+    for pattern, score, description in SUSPICIOUS_PATHS
+]
+_SUSPICIOUS_PATH_ANY = re.compile(
+    "|".join(f"(?:{pattern})" for pattern, _, _ in SUSPICIOUS_PATHS)
+)
+_SUSPICIOUS_FILE_ACCESS_RES = [
+    (re.compile(pattern), score, description, tag)
+    for pattern, score, description, tag in SUSPICIOUS_FILE_ACCESS
+]
+_SUSPICIOUS_FILE_ACCESS_ANY = re.compile(
+    "|".join(f"(?:{pattern})" for pattern, _, _, _ in SUSPICIOUS_FILE_ACCESS)
+)
+
 
 def analyze_path(image_path: str | None) -> tuple[int, list[str], list[str]]:
     """
@@ -88,18 +108,29 @@ def analyze_path(image_path: str | None) -> tuple[int, list[str], list[str]]:
     if not image_path:
         return 0, [], []
     
-    risk_score = 0
-    reasons = []
-    behavior_tags = []
+    risk_score, reasons = _score_path(image_path.lower().replace("/", "\\"))
+    return risk_score, list(reasons), []
+
+
+@lru_cache(maxsize=8192)
+def _score_path(path_lower: str) -> tuple[int, tuple[str, ...]]:
+    """
+    Score a normalized path against SUSPICIOUS_PATHS.
     
-    path_lower = image_path.lower().replace("/", "\\")
+    Many processes share an image (every svchost.exe, for one), so results
+    are memoized per normalized path.
+    """
+    if not _SUSPICIOUS_PATH_ANY.search(path_lower):
+        return 0, ()
     
-    for pattern, score, description in SUSPICIOUS_PATHS:
-        if re.search(pattern, path_lower, re.IGNORECASE):
+    risk_score = 0
+    reasons = []
+    for regex, score, description in _SUSPICIOUS_PATH_RES:
+        if regex.search(path_lower):
             risk_score += score
             reasons.append(description)
     
-    return risk_score, reasons, behavior_tags
+    return risk_score, tuple(reasons)
 
 
 def analyze_file_access(file_path: str) -> tuple[int, str | None, str | None]:
@@ -112,9 +143,11 @@ def analyze_file_access(file_path: str) -> tuple[int, str | None, str | None]:
         return 0, None, None
     
     path_lower = file_path.lower().replace("/", "\\")
+    if not _SUSPICIOUS_FILE_ACCESS_ANY.search(path_lower):
+        return 0, None, None
     
-    for pattern, score, description, tag in SUSPICIOUS_FILE_ACCESS:
-        if re.search(pattern, path_lower, re.IGNORECASE):
+    for regex, score, description, tag in _SUSPICIOUS_FILE_ACCESS_RES:
+        if regex.search(path_lower):
             return score, description, tag
     
     return 0, None, None
@@ -2,9 +2,13 @@
 Pydantic models for process events.
 """
 
+from collections import defaultdict
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, Field
+from functools import cached_property
+from operator import attrgetter
+from typing import Iterable
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class OperationType(str, Enum):
@@ -66,10 +70,10 @@ class ProcessEvent(BaseModel):
     # Stack trace (PML exclusive)
     stack_trace: list[str] | None = Field(default=None, description="Call stack addresses")
     
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    @cached_property
+    def operation_lower(self) -> str:
+        """Lowercased operation, computed once per event for keyword checks."""
+        return self.operation.lower() if self.operation else ""
 
 
 class ParsedLogFile(BaseModel):
@@ -83,9 +87,81 @@ class ParsedLogFile(BaseModel):
     end_time: datetime | None = Field(default=None, description="Last event timestamp")
     events: list[ProcessEvent] = Field(default_factory=list, description="All parsed events")
     
+    # Per-PID event index, filled at ingest by from_events (not serialized)
+    _events_by_pid: dict[int, list[tuple[datetime, int, ProcessEvent]]] | None = PrivateAttr(
+        default=None
+    )
+    
+    @classmethod
+    def from_events(
+        cls, filename: str, format: str, events: Iterable[ProcessEvent]
+    ) -> "ParsedLogFile":
+        """
+        Collect events and compute the file metadata in a single pass.
+        
+        Args:
+            filename: Original filename
+            format: File format: pml, csv, or xml
+            events: Parsed events, typically a parser's ``iter_events``
+        """
+        collected: list[ProcessEvent] = []
+        unique_processes: set[tuple[int, str]] = set()
+        
+        for event in events:
+            collected.append(event)
+            
+            # Track unique processes
+            unique_processes.add((event.pid, event.process_name))
+        
+        # Time range in C over the finished list, not per-event comparisons
+        start_time: datetime | None = None
+        end_time: datetime | None = None
+        if collected:
+            start_time = min(map(attrgetter("timestamp"), collected))
+            end_time = max(map(attrgetter("timestamp"), collected))
+        
+        parsed = cls(
+            filename=filename,
+            format=format,
+            event_count=len(collected),
+            process_count=len(unique_processes),
+            start_time=start_time,
+            end_time=end_time,
+            events=collected
+        )
+        parsed._events_by_pid = _group_by_pid(collected)
+        return parsed
+    
+    @property
+    def events_by_pid(self) -> dict[int, list[tuple[datetime, int, ProcessEvent]]]:
+        """
+        Events grouped by process ID as ``(timestamp, seq, event)`` tuples.
+        
+        ``seq`` is the event's position in the file, so each list is in
+        timestamp order with ties in file order, ready for ``heapq.merge``.
+        """
+        if self._events_by_pid is None:
+            self._events_by_pid = _group_by_pid(self.events)
+        return self._events_by_pid
+    
     @property
     def duration_seconds(self) -> float | None:
         """Calculate the capture duration in seconds."""
         if self.start_time and self.end_time:
             return (self.end_time - self.start_time).total_seconds()
         return None
+
+
+def _group_by_pid(
+    events: list[ProcessEvent]
+) -> dict[int, list[tuple[datetime, int, ProcessEvent]]]:
+    """Group events by PID as (timestamp, seq, event), each group in order."""
+    grouped: dict[int, list[tuple[datetime, int, ProcessEvent]]] = defaultdict(list)
+    for seq, event in enumerate(events):
+        grouped[event.pid].append((event.timestamp, seq, event))
+    
+    # Logs are written in time order, so this is a linear check in practice;
+    # seq is unique, so tuples never fall through to comparing events
+    for pid_events in grouped.values():
+        pid_events.sort()
+    return dict(grouped)
@@ -3,6 +3,7 @@ Pydantic models for process analysis.
 """
 
 from enum import Enum
+from typing import Any
 from pydantic import BaseModel, Field
 
 
@@ -131,3 +132,15 @@ class AnalysisResult(BaseModel):
     
     # Top findings
     top_threats: list[ProcessInfo] = Field(default_factory=list, description="Top 10 risky processes")
+    
+    # Event timelines, served by the timeline endpoint rather than with the result
+    timeline: list[dict[str, Any]] = Field(
+        default_factory=list,
+        exclude=True,
+        description="Chronological events from all processes"
+    )
+    anomaly_timeline: list[dict[str, Any]] = Field(
+        default_factory=list,
+        exclude=True,
+        description="Chronological events from flagged processes"
+    )
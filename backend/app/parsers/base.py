@@ -2,11 +2,13 @@
 Base parser interface for log file parsers.
 """
 
+import io
+import sys
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 
-from app.models import ParsedLogFile
+from app.models import ParsedLogFile, ProcessEvent
 
 
 class BaseParser(ABC):
@@ -49,7 +51,63 @@ class BaseParser(ABC):
         """
         pass
     
+    @abstractmethod
+    def iter_events(self, file_stream: BinaryIO) -> Iterator[ProcessEvent]:
+        """
+        Lazily parse events from a stream, one at a time.
+        
+        Lets callers that only aggregate avoid holding every event in memory.
+        
+        Args:
+            file_stream: Binary file stream
+            
+        Yields:
+            Each successfully parsed ProcessEvent, in file order
+        """
+        pass
+    
     def can_parse(self, filename: str) -> bool:
         """Check if this parser can handle the given filename."""
         ext = Path(filename).suffix.lower()
         return ext in self.supported_extensions
+    
+    @staticmethod
+    def _io_stream(file_stream: BinaryIO) -> BinaryIO:
+        """
+        Return ``file_stream`` if it implements the ``io`` interface, else an
+        in-memory copy.
+        
+        Before Python 3.11, ``SpooledTemporaryFile`` (Starlette's upload file)
+        is not an ``io.IOBase`` and lacks ``readable()``/``seekable()``, so it
+        cannot be wrapped in an ``io.TextIOWrapper`` directly.
+        """
+        if isinstance(file_stream, io.IOBase):
+            return file_stream
+        return io.BytesIO(file_stream.read())
+    
+    @staticmethod
+    def _is_seekable(file_stream: BinaryIO) -> bool:
+        """
+        Check whether a stream supports random access.
+        
+        Falls back to probing ``tell``/``seek`` for streams without
+        ``seekable()``, such as ``SpooledTemporaryFile`` before Python 3.11.
+        """
+        seekable = getattr(file_stream, "seekable", None)
+        if seekable is not None:
+            return seekable()
+        try:
+            file_stream.seek(file_stream.tell())
+        except (AttributeError, OSError):
+            return False
+        return True
+    
+    @staticmethod
+    def _intern(value: str | None) -> str | None:
+        """
+        Intern a low-cardinality event field such as user or integrity.
+        
+        Every event from the same process repeats these values, so sharing
+        one string object per distinct value saves memory on large logs.
+        """
+        return sys.intern(value) if value else value
@@ -4,9 +4,11 @@ CSV file parser for Process Monitor exported CSV files.
 
 import csv
 import io
+import sys
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 
 from app.models import ProcessEvent, ParsedLogFile
 from app.parsers.base import BaseParser
@@ -15,6 +17,41 @@ from app.parsers.base import BaseParser
 class CSVParser(BaseParser):
     """Parser for CSV files exported from Process Monitor."""
     
+    # Process Monitor uses various time formats
+    _TIMESTAMP_FORMATS = (
+        "%I:%M:%S.%f %p",  # 12-hour with AM/PM
+        "%H:%M:%S.%f",     # 24-hour with microseconds
+        "%H:%M:%S",        # 24-hour without microseconds
+        "%Y-%m-%d %H:%M:%S.%f",
+        "%Y-%m-%d %H:%M:%S",
+    )
+    
+    # Columns read from each row, with the default used when a column is absent
+    _COLUMNS: tuple[tuple[str, str | None], ...] = (
+        ("Time of Day", ""),
+        ("Process Name", "Unknown"),
+        ("PID", "0"),
+        ("Operation", "Unknown"),
+        ("Path", ""),
+        ("Result", ""),
+        ("Detail", ""),
+        # Extended columns (may not be present)
+        ("Parent PID", None),
+        ("Command Line", None),
+        ("User", None),
+        ("Image Path", None),
+        ("Company", None),
+        ("Description", None),
+        ("Integrity", None),
+    )
+    
+    # Rows share a handful of timestamp strings, so cache raw string -> parse
+    _TS_CACHE_SIZE = 16384
+    
+    def __init__(self) -> None:
+        self._ts_cache: dict[str, datetime] = {}
+        self._last_fmt_idx = 0
+    
     @property
     def supported_extensions(self) -> list[str]:
         return [".csv"]
@@ -29,66 +66,80 @@ class CSVParser(BaseParser):
     
     def parse_stream(self, file_stream: BinaryIO, filename: str) -> ParsedLogFile:
         """Parse a CSV file from a stream."""
-        events: list[ProcessEvent] = []
-        unique_processes: set[tuple[int, str]] = set()
-        start_time: datetime | None = None
-        end_time: datetime | None = None
-        
-        # Decode stream to text
-        content = file_stream.read()
-        text_content = content.decode("utf-8-sig")  # Handle BOM
-        text_stream = io.StringIO(text_content)
-        
-        # Parse CSV
-        reader = csv.DictReader(text_stream)
-        
-        for row in reader:
-            try:
-                parsed_event = self._convert_row(row)
-                events.append(parsed_event)
+        return ParsedLogFile.from_events(filename, "csv", self.iter_events(file_stream))
+    
+    def iter_events(self, file_stream: BinaryIO) -> Iterator[ProcessEvent]:
+        """Lazily parse events from a CSV stream."""
+        # Decode incrementally rather than holding the whole file as bytes and text;
+        # utf-8-sig handles the BOM
+        text_stream = io.TextIOWrapper(
+            self._io_stream(file_stream), encoding="utf-8-sig", newline=""
+        )
+        try:
+            reader = csv.reader(text_stream)
+            header = next(reader, [])
+            getter, width, tail = self._row_layout(header)
+            padding = [None] * width
+            
+            for row in reader:
+                # Blank lines carry no event (DictReader skipped them too)
+                if not row:
+                    continue
                 
-                # Track unique processes
-                unique_processes.add((parsed_event.pid, parsed_event.process_name))
+                try:
+                    if len(row) != width:
+                        row = (row + padding)[:width]
+                    parsed_event = self._convert_row(getter(row + tail))
+                except Exception:
+                    # Skip malformed rows
+                    continue
                 
-                # Track time range
-                if start_time is None or parsed_event.timestamp < start_time:
-                    start_time = parsed_event.timestamp
-                if end_time is None or parsed_event.timestamp > end_time:
-                    end_time = parsed_event.timestamp
-                    
-            except Exception:
-                # Skip malformed rows
-                continue
+                yield parsed_event
+        finally:
+            # Leave the caller's stream open
+            text_stream.detach()
+    
+    def _row_layout(self, header: list[str]) -> tuple[itemgetter, int, list[str | None]]:
+        """
+        Resolve the columns ``_convert_row`` reads against a CSV header.
         
-        return ParsedLogFile(
-            filename=filename,
-            format="csv",
-            event_count=len(events),
-            process_count=len(unique_processes),
-            start_time=start_time,
-            end_time=end_time,
-            events=events
-        )
+        Returns an itemgetter over ``row + tail`` yielding the values in
+        ``_COLUMNS`` order, the header width rows are padded or cut to, and
+        the tail of defaults that stands in for columns the file lacks.
+        """
+        # Last occurrence wins on duplicate names, as with DictReader
+        positions = {name: idx for idx, name in enumerate(header)}
+        width = len(header)
+        indices: list[int] = []
+        tail: list[str | None] = []
+        for name, default in self._COLUMNS:
+            idx = positions.get(name)
+            if idx is None:
+                idx = width + len(tail)
+                tail.append(default)
+            indices.append(idx)
+        return itemgetter(*indices), width, tail
     
-    def _convert_row(self, row: dict) -> ProcessEvent:
-        """Convert a CSV row to ProcessEvent."""
+    def _convert_row(self, values: tuple) -> ProcessEvent:
+        """Convert a CSV row, laid out as ``_COLUMNS``, to ProcessEvent."""
+        (
+            time_of_day, process_name, pid, operation, path, result, detail,
+            parent_pid, command_line, user, image_path, company, description, integrity,
+        ) = values
+        
         # Standard Process Monitor CSV columns
-        timestamp = self._parse_timestamp(row.get("Time of Day", ""))
-        process_name = row.get("Process Name", "Unknown")
-        pid = self._parse_int(row.get("PID", "0"))
-        operation = row.get("Operation", "Unknown")
-        path = row.get("Path", "")
-        result = row.get("Result", "")
-        detail = row.get("Detail", "")
+        timestamp = self._parse_timestamp(time_of_day)
+        process_name = sys.intern(process_name)
+        pid = self._parse_int(pid)
+        operation = sys.intern(operation)
+        result = sys.intern(result)
         
         # Extended columns (may not be present)
-        parent_pid = self._parse_int(row.get("Parent PID"))
-        command_line = row.get("Command Line")
-        user = row.get("User")
-        image_path = row.get("Image Path")
-        company = row.get("Company")
-        description = row.get("Description")
-        integrity = row.get("Integrity")
+        parent_pid = self._parse_int(parent_pid)
+        user = self._intern(user)
+        image_path = self._intern(image_path)
+        company = self._intern(company)
+        integrity = self._intern(integrity)
         
         return ProcessEvent(
             timestamp=timestamp,
@@ -112,28 +163,42 @@ class CSVParser(BaseParser):
         if not time_str:
             return datetime.now()
         
-        # Process Monitor uses various time formats
-        formats = [
-            "%I:%M:%S.%f %p",  # 12-hour with AM/PM
-            "%H:%M:%S.%f",     # 24-hour with microseconds
-            "%H:%M:%S",        # 24-hour without microseconds
-            "%Y-%m-%d %H:%M:%S.%f",
-            "%Y-%m-%d %H:%M:%S",
-        ]
+        parsed = self._ts_cache.get(time_str)
+        if parsed is None:
+            parsed = self._strptime(time_str.strip())
+            if parsed is None:
+                # Default to now if parsing fails
+                return datetime.now()
+            if len(self._ts_cache) >= self._TS_CACHE_SIZE:
+                self._ts_cache.clear()
+            self._ts_cache[time_str] = parsed
         
-        for fmt in formats:
+        # If no date, use today (applied after the cache so it never goes stale)
+        if parsed.year == 1900:
+            today = datetime.now().date()
+            parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
+        return parsed
+    
+    def _strptime(self, time_str: str) -> datetime | None:
+        """Try the last format that matched first, then the others in order."""
+        formats = self._TIMESTAMP_FORMATS
+        last = self._last_fmt_idx
+        try:
+            return datetime.strptime(time_str, formats[last])
+        except ValueError:
+            pass
+        
+        for idx, fmt in enumerate(formats):
+            if idx == last:
+                continue
             try:
-                parsed = datetime.strptime(time_str.strip(), fmt)
-                # If no date, use today
-                if parsed.year == 1900:
-                    today = datetime.now().date()
-                    parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
-                return parsed
+                parsed = datetime.strptime(time_str, fmt)
             except ValueError:
                 continue
+            self._last_fmt_idx = idx
+            return parsed
         
-        # Default to now if parsing fails
-        return datetime.now()
+        return None
     
     def _parse_int(self, value: str | None) -> int:
         """Parse integer from string, defaulting to 0."""
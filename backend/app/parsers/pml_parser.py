@@ -4,15 +4,19 @@ Uses the procmon-parser library for parsing.
 """
 
 import io
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 
 from procmon_parser import ProcmonLogsReader
 
 from app.models import ProcessEvent, ParsedLogFile
 from app.parsers.base import BaseParser
 
+# Windows FILETIME epoch (100-nanosecond intervals since 1601-01-01)
+_FILETIME_EPOCH = datetime(1601, 1, 1)
+
 
 class PMLParser(BaseParser):
     """Parser for native PML binary files from Process Monitor."""
@@ -31,43 +35,24 @@ class PMLParser(BaseParser):
     
     def parse_stream(self, file_stream: BinaryIO, filename: str) -> ParsedLogFile:
         """Parse a PML file from a stream."""
-        events: list[ProcessEvent] = []
-        unique_processes: set[tuple[int, str]] = set()
-        start_time: datetime | None = None
-        end_time: datetime | None = None
-        
-        # Read stream into memory for procmon-parser
-        content = file_stream.read()
-        file_stream = io.BytesIO(content)
+        return ParsedLogFile.from_events(filename, "pml", self.iter_events(file_stream))
+    
+    def iter_events(self, file_stream: BinaryIO) -> Iterator[ProcessEvent]:
+        """Lazily parse events from a PML stream."""
+        # procmon-parser seeks around the file, so hand it the stream directly
+        # when it can (on-disk files, spooled uploads) and only buffer the
+        # whole file in memory when it can't
+        if not self._is_seekable(file_stream):
+            file_stream = io.BytesIO(file_stream.read())
         
         try:
             reader = ProcmonLogsReader(file_stream)
             
             for event in reader:
-                parsed_event = self._convert_event(event)
-                events.append(parsed_event)
-                
-                # Track unique processes
-                unique_processes.add((parsed_event.pid, parsed_event.process_name))
-                
-                # Track time range
-                if start_time is None or parsed_event.timestamp < start_time:
-                    start_time = parsed_event.timestamp
-                if end_time is None or parsed_event.timestamp > end_time:
-                    end_time = parsed_event.timestamp
-                    
+                yield self._convert_event(event)
+        
         except Exception as e:
             raise ValueError(f"Failed to parse PML file: {str(e)}") from e
-        
-        return ParsedLogFile(
-            filename=filename,
-            format="pml",
-            event_count=len(events),
-            process_count=len(unique_processes),
-            start_time=start_time,
-            end_time=end_time,
-            events=events
-        )
     
     def _convert_event(self, event) -> ProcessEvent:
         """Convert a procmon-parser event to our ProcessEvent model."""
@@ -79,9 +64,9 @@ class PMLParser(BaseParser):
         process_name, pid, image_path = self._parse_process_info(event)
         
         # Extract operation details
-        operation = str(event.operation) if hasattr(event, "operation") else "Unknown"
+        operation = sys.intern(str(event.operation)) if hasattr(event, "operation") else "Unknown"
         path = str(event.path) if hasattr(event, "path") and event.path else ""
-        result = str(event.result) if hasattr(event, "result") else ""
+        result = sys.intern(str(event.result)) if hasattr(event, "result") else ""
         detail = str(event.detail) if hasattr(event, "detail") and event.detail else ""
         
         # Extract extended info
@@ -89,10 +74,10 @@ class PMLParser(BaseParser):
         duration = self._safe_get_float(event, "duration", "Duration")
         parent_pid = self._safe_get_int(event, "parent_pid", "Parent PID")
         command_line = self._safe_get(event, "command_line", "Command Line")
-        user = self._safe_get(event, "user", "User")
-        company = self._safe_get(event, "company", "Company")
+        user = self._intern(self._safe_get(event, "user", "User"))
+        company = self._intern(self._safe_get(event, "company", "Company"))
         description = self._safe_get(event, "description", "Description")
-        integrity = self._safe_get(event, "integrity", "Integrity")
+        integrity = self._intern(self._safe_get(event, "integrity", "Integrity"))
         category = str(event.event_class) if hasattr(event, "event_class") else None
         
         # Extract stack trace if available
@@ -152,7 +137,7 @@ class PMLParser(BaseParser):
                 # Simple format - just the name
                 process_name = proc_str
         
-        return process_name, pid, image_path
+        return sys.intern(process_name), pid, self._intern(image_path)
     
     def _extract_timestamp(self, event) -> datetime:
         """Extract timestamp from event, with fallback."""
@@ -166,9 +151,9 @@ class PMLParser(BaseParser):
                     # Handle Windows FILETIME (100-nanosecond intervals since 1601)
                     if isinstance(val, (int, float)):
                         try:
-                            # Convert FILETIME to datetime
-                            epoch = datetime(1601, 1, 1)
-                            return epoch + __import__("datetime").timedelta(microseconds=val / 10)
+                            # Convert FILETIME to datetime; integer division keeps
+                            # full precision where val / 10 would round as a float
+                            return _FILETIME_EPOCH + timedelta(microseconds=val // 10)
                         except (ValueError, OverflowError):
                             pass
         
@@ -2,10 +2,11 @@
 XML file parser for Process Monitor exported XML files.
 """
 
+import sys
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 
 from app.models import ProcessEvent, ParsedLogFile
 from app.parsers.base import BaseParser
@@ -14,6 +15,23 @@ from app.parsers.base import BaseParser
 class XMLParser(BaseParser):
     """Parser for XML files exported from Process Monitor."""
     
+    _TIMESTAMP_FORMATS = (
+        "%I:%M:%S.%f %p",
+        "%H:%M:%S.%f",
+        "%H:%M:%S",
+        "%Y-%m-%dT%H:%M:%S.%f",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%d %H:%M:%S.%f",
+        "%Y-%m-%d %H:%M:%S",
+    )
+    
+    # Rows share a handful of timestamp strings, so cache raw string -> parse
+    _TS_CACHE_SIZE = 16384
+    
+    def __init__(self) -> None:
+        self._ts_cache: dict[str, datetime] = {}
+        self._last_fmt_idx = 0
+    
     @property
     def supported_extensions(self) -> list[str]:
         return [".xml"]
@@ -28,11 +46,10 @@ class XMLParser(BaseParser):
     
     def parse_stream(self, file_stream: BinaryIO, filename: str) -> ParsedLogFile:
         """Parse an XML file from a stream."""
-        events: list[ProcessEvent] = []
-        unique_processes: set[tuple[int, str]] = set()
-        start_time: datetime | None = None
-        end_time: datetime | None = None
-        
+        return ParsedLogFile.from_events(filename, "xml", self.iter_events(file_stream))
+    
+    def iter_events(self, file_stream: BinaryIO) -> Iterator[ProcessEvent]:
+        """Lazily parse events from an XML stream."""
         try:
             # Parse XML incrementally to handle large files
             context = ET.iterparse(file_stream, events=["end"])
@@ -42,73 +59,48 @@ class XMLParser(BaseParser):
                 if elem.tag.lower() == "event":
                     try:
                         parsed_event = self._convert_element(elem)
-                        events.append(parsed_event)
-                        
-                        # Track unique processes
-                        unique_processes.add((parsed_event.pid, parsed_event.process_name))
-                        
-                        # Track time range
-                        if start_time is None or parsed_event.timestamp < start_time:
-                            start_time = parsed_event.timestamp
-                        if end_time is None or parsed_event.timestamp > end_time:
-                            end_time = parsed_event.timestamp
-                            
                     except Exception:
                         # Skip malformed events
-                        pass
+                        parsed_event = None
                     
                     # Clear element to save memory
                     elem.clear()
                     
+                    if parsed_event is not None:
+                        yield parsed_event
+                    
         except ET.ParseError as e:
             raise ValueError(f"Failed to parse XML file: {str(e)}") from e
-        
-        return ParsedLogFile(
-            filename=filename,
-            format="xml",
-            event_count=len(events),
-            process_count=len(unique_processes),
-            start_time=start_time,
-            end_time=end_time,
-            events=events
-        )
     
     def _convert_element(self, elem: ET.Element) -> ProcessEvent:
         """Convert an XML event element to ProcessEvent."""
-        # Helper to get element text
-        def get_text(tag: str) -> str:
-            child = elem.find(tag)
-            if child is None:
-                # Try case-insensitive
-                for c in elem:
-                    if c.tag.lower() == tag.lower():
-                        return c.text or ""
-            return child.text if child is not None and child.text else ""
-        
-        def get_int(tag: str) -> int:
-            text = get_text(tag)
-            try:
-                return int(text) if text else 0
-            except ValueError:
-                return 0
+        # Index child text by lowercased tag once, so each field is a dict
+        # lookup rather than a find() plus a case-insensitive rescan on a miss.
+        # Built in reverse so the first child wins on duplicate tags.
+        fields = {child.tag.lower(): child.text or "" for child in reversed(elem)}
+        get_text = fields.get
         
         # Parse standard fields
-        timestamp = self._parse_timestamp(get_text("Time_of_Day") or get_text("TimeOfDay"))
-        process_name = get_text("Process_Name") or get_text("ProcessName") or "Unknown"
-        pid = get_int("PID")
-        operation = get_text("Operation") or "Unknown"
-        path = get_text("Path")
-        result = get_text("Result")
-        detail = get_text("Detail")
+        timestamp = self._parse_timestamp(get_text("time_of_day") or get_text("timeofday", ""))
+        process_name = sys.intern(get_text("process_name") or get_text("processname") or "Unknown")
+        pid = self._parse_int(get_text("pid"))
+        operation = sys.intern(get_text("operation") or "Unknown")
+        path = get_text("path", "")
+        result = sys.intern(get_text("result", ""))
+        detail = get_text("detail", "")
         
         # Extended fields
-        parent_pid = get_int("Parent_PID") or get_int("ParentPID") or None
-        command_line = get_text("Command_Line") or get_text("CommandLine") or None
-        user = get_text("User") or None
-        image_path = get_text("Image_Path") or get_text("ImagePath") or None
-        company = get_text("Company") or None
-        description = get_text("Description") or None
-        integrity = get_text("Integrity") or None
+        parent_pid = (
+            self._parse_int(get_text("parent_pid"))
+            or self._parse_int(get_text("parentpid"))
+            or None
+        )
+        command_line = get_text("command_line") or get_text("commandline") or None
+        user = self._intern(get_text("user") or None)
+        image_path = self._intern(get_text("image_path") or get_text("imagepath") or None)
+        company = self._intern(get_text("company") or None)
+        description = get_text("description") or None
+        integrity = self._intern(get_text("integrity") or None)
         
         return ProcessEvent(
             timestamp=timestamp,
@@ -127,29 +119,53 @@ class XMLParser(BaseParser):
             integrity=integrity
         )
     
+    def _parse_int(self, value: str | None) -> int:
+        """Parse integer from element text, defaulting to 0."""
+        if not value:
+            return 0
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    
     def _parse_timestamp(self, time_str: str) -> datetime:
         """Parse timestamp from XML time string."""
         if not time_str:
             return datetime.now()
         
-        formats = [
-            "%I:%M:%S.%f %p",
-            "%H:%M:%S.%f",
-            "%H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S.%f",
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%d %H:%M:%S.%f",
-            "%Y-%m-%d %H:%M:%S",
-        ]
+        parsed = self._ts_cache.get(time_str)
+        if parsed is None:
+            parsed = self._strptime(time_str.strip())
+            if parsed is None:
+                # Default to now if parsing fails
+                return datetime.now()
+            if len(self._ts_cache) >= self._TS_CACHE_SIZE:
+                self._ts_cache.clear()
+            self._ts_cache[time_str] = parsed
         
-        for fmt in formats:
+        # If no date, use today (applied after the cache so it never goes stale)
+        if parsed.year == 1900:
+            today = datetime.now().date()
+            parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
+        return parsed
+    
+    def _strptime(self, time_str: str) -> datetime | None:
+        """Try the last format that matched first, then the others in order."""
+        formats = self._TIMESTAMP_FORMATS
+        last = self._last_fmt_idx
+        try:
+            return datetime.strptime(time_str, formats[last])
+        except ValueError:
+            pass
+        
+        for idx, fmt in enumerate(formats):
+            if idx == last:
+                continue
             try:
-                parsed = datetime.strptime(time_str.strip(), fmt)
-                if parsed.year == 1900:
-                    today = datetime.now().date()
-                    parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
-                return parsed
+                parsed = datetime.strptime(time_str, fmt)
             except ValueError:
                 continue
+            self._last_fmt_idx = idx
+            return parsed
         
-        return datetime.now()
+        return None
@@ -0,0 +1,58 @@
+"""
+Test script for verifying the LOLBAS binary table has no duplicate names.
+
+A dict literal silently keeps only the last of two equal keys, so a
+duplicated entry would override the first one without any runtime error.
+This reads the source instead of importing the module to catch that.
+"""
+
+import ast
+import sys
+from collections import Counter
+from pathlib import Path
+
+LOLBAS_PATH = Path(__file__).parent / "app" / "detection" / "lolbas.py"
+
+
+def find_lolbas_keys(source: str) -> list[str]:
+    """Return the keys of the LOLBAS_BINARIES dict literal, in source order."""
+    for node in ast.walk(ast.parse(source)):
+        if (
+            isinstance(node, ast.Assign)
+            and any(isinstance(t, ast.Name) and t.id == "LOLBAS_BINARIES" for t in node.targets)
+            and isinstance(node.value, ast.Dict)
+        ):
+            return [ast.literal_eval(key) for key in node.value.keys]
+    raise AssertionError("LOLBAS_BINARIES dict literal not found")
+
+
+def test_lolbas_names_unique():
+    """Every LOLBAS binary name appears once and is lowercase."""
+    print("=" * 60)
+    print("ProcBench LOLBAS Table Test")
+    print("=" * 60)
+    
+    keys = find_lolbas_keys(LOLBAS_PATH.read_text(encoding="utf-8"))
+    print(f"\n    Found {len(keys)} LOLBAS entries")
+    
+    duplicates = [name for name, count in Counter(k.lower() for k in keys).items() if count > 1]
+    for name in duplicates:
+        print(f"    ❌ Duplicate entry: {name}")
+    
+    # Lookups lowercase the process name, so mixed-case keys never match
+    not_lower = [k for k in keys if k != k.lower()]
+    for name in not_lower:
+        print(f"    ❌ Key is not lowercase: {name}")
+    
+    if not duplicates and not not_lower:
+        print("    ✅ All names are unique and lowercase")
+    
+    assert not duplicates, f"Duplicate LOLBAS entries: {duplicates}"
+    assert not not_lower, f"Non-lowercase LOLBAS keys: {not_lower}"
+
+
+if __name__ == "__main__":
+    try:
+        test_lolbas_names_unique()
+    except AssertionError:
+        sys.exit(1)
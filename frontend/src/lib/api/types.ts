@@ -68,6 +68,8 @@ export interface TimelineEntry {
   timestamp: string | null;
   process_name: string;
   pid: number;
+  operation?: string;
+  path?: string;
   risk_score: number;
   is_anomaly: boolean;
   description: string;